@@ -1,60 +1,273 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Request
+from fastapi.responses import Response, PlainTextResponse, JSONResponse, StreamingResponse, FileResponse, RedirectResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
-from typing import List, Optional
+from typing import List, Optional, Iterable, Iterator, Literal
+import sys
 import uuid
+import random
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
 import asyncio
-import resend
-import qrcode
 from io import BytesIO
 import base64
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-import razorpay
+import json
+import gzip
+import importlib.util
+import re
+import shutil
+import signal
+from collections import deque, OrderedDict
+from pymongo import ReplaceOne, UpdateOne, monitoring
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+import time
+import threading
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from bisect import bisect_left
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ==================== INSTRUMENTATION ====================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS = []
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic counter keyed by label values, rendered in Prometheus text format"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.values = {}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def inc(self, label_values: tuple = (), amount: float = 1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in list(self.values.items())]
+
+class Gauge(Counter):
+    """Counter that can also go down"""
+    kind = "gauge"
+
+    def dec(self, label_values: tuple = (), amount: float = 1):
+        self.inc(label_values, -amount)
+
+class Histogram:
+    """Cumulative latency histogram keyed by label values"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        self.series = {}  # label values -> [per-bucket counts incl. +Inf, sum]
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+MONGO_LATENCY = Histogram("mongo_command_duration_seconds", "MongoDB command latency by collection", ("collection", "command"))
+MONGO_ERRORS = Counter("mongo_command_errors_total", "Failed MongoDB commands", ("collection", "command"))
+MONGO_SLOW = Counter("mongo_slow_commands_total", "MongoDB commands slower than SLOW_QUERY_MS", ("collection", "command"))
+OUTBOUND_LATENCY = Histogram("outbound_request_duration_seconds", "Latency of calls to external services", ("service", "operation"))
+OUTBOUND_ERRORS = Counter("outbound_request_errors_total", "Failed calls to external services", ("service", "operation"))
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Records per-collection command timings and logs slow queries"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        command = event.command
+        target = command.get('collection') if event.command_name == 'getMore' else command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else "-"
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed: bool = False):
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        labels = (collection, event.command_name)
+        seconds = event.duration_micros / 1_000_000
+        MONGO_LATENCY.observe(labels, seconds)
+        if failed:
+            MONGO_ERRORS.inc(labels)
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            MONGO_SLOW.inc(labels)
+            logging.warning("Slow Mongo command %s on %s took %.1f ms", event.command_name, collection, seconds * 1000)
+
+@contextmanager
+def outbound_timer(service: str, operation: str):
+    """Time a call to an external service"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OUTBOUND_ERRORS.inc((service, operation))
+        raise
+    finally:
+        OUTBOUND_LATENCY.observe((service, operation), time.perf_counter() - start)
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = scope.get('route')
+            path = getattr(route, 'path_format', None) or "unmatched"
+            HTTP_LATENCY.observe((scope['method'], path), elapsed)
+            HTTP_REQUESTS.inc((scope['method'], path, status_code))
+
+# MongoDB connection (each worker builds its own pooled client in lifespan)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+DB_NAME = os.environ['DB_NAME']
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_TIMEOUT_MS = int(os.environ.get('MONGO_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zlib')
+client = None
+db = None
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    """Create this worker's Mongo client with a bounded, pre-filled pool"""
+    return AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=60000,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        compressors=MONGO_COMPRESSORS,
+        tz_aware=True,
+        event_listeners=[MongoCommandTimer()]
+    )
 
-# Resend Email Setup
+# Email Setup (transport is created on first send)
 RESEND_API_KEY = os.environ.get('RESEND_API_KEY', '')
+RESEND_API_URL = os.environ.get('RESEND_API_URL', 'https://api.resend.com')  # point at a fake server in tests
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'onboarding@resend.dev')
-if RESEND_API_KEY:
-    resend.api_key = RESEND_API_KEY
+EMAIL_TRANSPORT = os.environ.get('EMAIL_TRANSPORT', 'resend')  # resend, smtp, log
+EMAIL_CONCURRENCY = int(os.environ.get('EMAIL_CONCURRENCY', '8'))
+EMAIL_TIMEOUT_SECONDS = float(os.environ.get('EMAIL_TIMEOUT_SECONDS', '10'))
+EMAIL_HTTP2 = os.environ.get('EMAIL_HTTP2', '1') == '1'
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '1025'))
 
 # Razorpay Setup
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
-if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-else:
-    razorpay_client = None
+razorpay_client = None
+
+def create_razorpay_client():
+    """Create a Razorpay client, or None when keys are missing"""
+    if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
+        import razorpay
+        return razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    return None
+
+def get_razorpay_client():
+    """Return this worker's Razorpay client, importing the SDK on first payment"""
+    global razorpay_client
+    if razorpay_client is None:
+        razorpay_client = create_razorpay_client()
+    return razorpay_client
 
 # JWT Setup
 JWT_SECRET = os.environ.get('JWT_SECRET', 'star_marketing_secret_key_2025')
 JWT_ALGORITHM = 'HS256'
 
-# Create the main app
-app = FastAPI()
+# Routers; the app itself is built by create_app()
 api_router = APIRouter(prefix="/api")
+system_router = APIRouter()
 # security = HTTPBearer()
 security = HTTPBearer(auto_error=False)
 
@@ -101,6 +314,7 @@ class Member(BaseModel):
     pincode: Optional[str] = None
     photo_url: Optional[str] = None
     referrer_id: Optional[str] = None
+    ancestors: List[str] = []  # referrer chain, root first
     status: str = "pending"  # pending, approved, blocked
     joined_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -111,15 +325,18 @@ class Donation(BaseModel):
     donor_email: EmailStr
     donor_phone: str
     amount: float
-    payment_method: str  # online, cash, bank_transfer
+    payment_method: str  # online, cash, bank_transfer, mandate
     payment_id: Optional[str] = None
     order_id: Optional[str] = None
-    status: str = "pending"  # pending, completed, failed
+    status: str = "pending"  # pending, charging, completed, failed, expired
     receipt_number: str
     purpose: Optional[str] = None
     referrer_member_id: Optional[str] = None
+    referrer_path: List[str] = []  # referrer's ancestors + referrer, for network totals
     campaign_id: Optional[str] = None
+    subscription_id: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    completed_at: Optional[datetime] = None
     is_80g_eligible: bool = True
 
 class Certificate(BaseModel):
@@ -206,6 +423,19 @@ class Project(BaseModel):
     status: str = "active"
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class Expense(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    project_id: Optional[str] = None  # None for general running costs
+    category: str = Field(pattern=r"^[a-z][a-z0-9_]{0,31}$")  # a key in the project's category breakdown
+    amount: float
+    description: str
+    expense_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    receipt_urls: List[str] = Field(default=[], max_length=10)
+    reverses: Optional[str] = None  # id of the entry this one cancels
+    recorded_by: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class Enquiry(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -234,10 +464,143 @@ class Designation(BaseModel):
     benefits: List[str] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# What a list view renders for each model (?view=summary)
+SUMMARY_PROJECTIONS = {
+    News: {"id": 1, "title": 1, "image_url": 1, "published": 1, "created_at": 1},
+    Activity: {"id": 1, "title": 1, "images": {"$slice": 1}, "created_at": 1},
+    Campaign: {"id": 1, "title": 1, "goal_amount": 1, "current_amount": 1, "start_date": 1, "end_date": 1,
+               "image_url": 1, "status": 1},
+    Event: {"id": 1, "title": 1, "event_date": 1, "location": 1, "registration_fee": 1, "is_paid": 1,
+            "max_participants": 1, "registered_count": 1, "image_url": 1},
+    Project: {"id": 1, "title": 1, "budget": 1, "spent": 1, "start_date": 1, "end_date": 1, "status": 1},
+    Expense: {"id": 1, "project_id": 1, "category": 1, "amount": 1, "expense_date": 1},
+    Internship: {"id": 1, "title": 1, "duration": 1, "positions": 1, "created_at": 1},
+    Beneficiary: {"id": 1, "name": 1, "age": 1, "gender": 1, "category": 1, "created_at": 1},
+    Certificate: {"id": 1, "certificate_type": 1, "recipient_name": 1, "certificate_number": 1, "issue_date": 1},
+    Donation: {"id": 1, "donor_name": 1, "amount": 1, "status": 1, "receipt_number": 1, "campaign_id": 1,
+               "created_at": 1},
+}
+
+def fieldset(model):
+    """Dependency turning ?fields=a,b or ?view=summary|detail into a Mongo projection for `model`"""
+    # async so FastAPI calls it inline; a sync dependency would queue behind bcrypt on the threadpool
+    async def projection(fields: Optional[str] = None, view: Literal["summary", "detail"] = "detail") -> dict:
+        if fields:
+            names = {name.strip() for name in fields.split(",") if name.strip()}
+            unknown = sorted(names - set(model.model_fields))
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+            return {"_id": 0, "id": 1, **{name: 1 for name in names}}
+        if view == "summary":
+            return {"_id": 0, **SUMMARY_PROJECTIONS[model]}
+        return {"_id": 0}
+    return projection
+
 # ==================== HELPER FUNCTIONS ====================
 
+# Stored shape: dates as BSON dates, money as integer paise next to the rupee amount.
+# Documents written before migrations 1 and 2 hold ISO strings and bare floats, so reads accept both.
+DATE_FIELDS = {
+    "users": ("created_at",),
+    "members": ("joined_at", "deleted_at"),
+    "donations": ("created_at", "deleted_at"),
+    "donations_archive": ("created_at", "deleted_at", "archived_at"),
+    "certificates": ("issue_date", "deleted_at"),
+    "news": ("created_at", "deleted_at"),
+    "activities": ("created_at", "deleted_at"),
+    "campaigns": ("created_at", "start_date", "end_date", "deleted_at"),
+    "enquiries": ("created_at",),
+    "enquiries_archive": ("created_at", "archived_at"),
+    "beneficiaries": ("created_at", "deleted_at"),
+    "events": ("created_at", "event_date", "deleted_at"),
+    "projects": ("created_at", "start_date", "end_date", "deleted_at"),
+    "expenses": ("created_at", "expense_date"),
+    "subscriptions": ("created_at", "next_charge_at", "last_charged_at"),
+    "internships": ("created_at", "deleted_at"),
+    "designations": ("created_at", "deleted_at"),
+    "receipts": ("created_at", "deleted_at"),
+    "referral_leaderboard": ("refreshed_at",),
+    "broadcasts": ("created_at", "claimed_at", "completed_at"),
+    "broadcast_deliveries": ("claimed_at", "retry_at", "sent_at"),
+}
+MONEY_FIELDS = {
+    "donations": ("amount",),
+    "donations_archive": ("amount",),
+    "campaigns": ("goal_amount", "current_amount"),
+    "events": ("registration_fee",),
+    "projects": ("budget", "spent"),
+    "expenses": ("amount",),
+    "subscriptions": ("amount",),
+    "members": ("designation_fee",),
+    "designations": ("fee",),
+    "receipts": ("amount",),
+}
+
+def parse_stored_date(value) -> Optional[datetime]:
+    """A timezone-aware datetime for a stored date, or None if it isn't one"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def to_paise(amount) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def storage_changes(collection: str, doc: dict, dates: bool = True, money: bool = True) -> dict:
+    """Fields of a document that are not yet in the stored shape, with their new values"""
+    changes = {}
+    if dates:
+        for field in DATE_FIELDS.get(collection, ()):
+            if isinstance(doc.get(field), str):
+                parsed = parse_stored_date(doc[field])
+                if parsed:
+                    changes[field] = parsed
+    if money:
+        for field in MONEY_FIELDS.get(collection, ()):
+            amount = doc.get(field)
+            if isinstance(amount, (int, float)) and not isinstance(amount, bool):
+                paise = to_paise(amount)
+                if doc.get(f"{field}_paise") != paise:
+                    changes[f"{field}_paise"] = paise
+    return changes
+
+def to_storage(collection: str, doc: dict) -> dict:
+    """Bring a new document into the stored shape before it is inserted"""
+    doc.update(storage_changes(collection, doc))
+    return doc
+
+def date_match(field: str, op: str, moment: datetime) -> dict:
+    """Compare a date field that may still hold ISO strings from before migration 1"""
+    return {"$or": [{field: {op: moment}}, {field: {op: moment.isoformat()}}]}
+
+def date_range(field: str, start: datetime, end: datetime) -> dict:
+    """date_match() for start <= field <= end"""
+    return {"$or": [
+        {field: {"$gte": start, "$lte": end}},
+        {field: {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    ]}
+
+def paise_total(field: str) -> dict:
+    """$group accumulators summing a money field; rupees() turns the result back into an amount"""
+    return {
+        "paise": {"$sum": f"${field}_paise"},
+        # Documents not yet migrated have no paise field, so their rupee amount is summed instead
+        "legacy": {"$sum": {"$cond": [{"$ifNull": [f"${field}_paise", False]}, 0, f"${field}"]}}
+    }
+
+def rupees(row: Optional[dict]) -> float:
+    if not row:
+        return 0
+    return (row['paise'] + round(row['legacy'] * 100)) / 100
+
 def generate_qr_code(data: str) -> str:
     """Generate QR code and return as base64 string"""
+    import qrcode  # pulls in PIL; deferred so cold starts don't pay for it
+
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(data)
     qr.make(fit=True)
@@ -278,28 +641,977 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+class ResendTransport:
+    """Resend's REST API over one pooled keep-alive client (HTTP/2 when h2 is installed)"""
+
+    def __init__(self):
+        import httpx
+        import importlib.util
+        self.client = httpx.AsyncClient(
+            base_url=RESEND_API_URL,
+            headers={"Authorization": f"Bearer {RESEND_API_KEY}"},
+            http2=EMAIL_HTTP2 and importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_connections=EMAIL_CONCURRENCY, max_keepalive_connections=EMAIL_CONCURRENCY),
+            timeout=httpx.Timeout(EMAIL_TIMEOUT_SECONDS, connect=5.0)
+        )
+
+    async def send(self, message: dict):
+        response = await self.client.post("/emails", json=message)
+        response.raise_for_status()
+
+    async def close(self):
+        await self.client.aclose()
+
+class SmtpTransport:
+    """Plain SMTP, for a local catcher such as MailHog or `python -m aiosmtpd`"""
+
+    async def send(self, message: dict):
+        import smtplib
+        from email.message import EmailMessage
+        mail = EmailMessage()
+        mail["From"] = message["from"]
+        mail["To"] = ", ".join(message["to"])
+        mail["Subject"] = message["subject"]
+        mail.set_content(message["html"], subtype="html")
+
+        def deliver():
+            with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=EMAIL_TIMEOUT_SECONDS) as smtp:
+                smtp.send_message(mail)
+        await asyncio.to_thread(deliver)
+
+    async def close(self):
+        pass
+
+class LogTransport:
+    """Keeps sent messages in memory instead of delivering them"""
+
+    def __init__(self):
+        self.sent = deque(maxlen=100)
+
+    async def send(self, message: dict):
+        self.sent.append(message)
+        logger.info(f"Email to {message['to']}: {message['subject']}")
+
+    async def close(self):
+        pass
+
+def create_email_transport():
+    """Build the configured transport, or None when Resend has no API key"""
+    if EMAIL_TRANSPORT == 'smtp':
+        return SmtpTransport()
+    if EMAIL_TRANSPORT == 'log':
+        return LogTransport()
+    if RESEND_API_KEY:
+        return ResendTransport()
+    return None
+
+email_transport = None
+EMAIL_SEMAPHORE = asyncio.Semaphore(EMAIL_CONCURRENCY)
+
+def get_email_transport():
+    """This worker's email transport, created on first use"""
+    global email_transport
+    if email_transport is None:
+        email_transport = create_email_transport()
+    return email_transport
+
+async def close_email_transport():
+    """Close the pooled connections; runs on shutdown after the queue is flushed"""
+    global email_transport
+    if email_transport is not None:
+        await email_transport.close()
+        email_transport = None
+
+async def deliver_email(to: str, subject: str, html_content: str):
+    """Send one email through the configured transport; raises on failure"""
+    transport = get_email_transport()
+    if transport is None:
+        raise RuntimeError("Resend API key not configured")
+    params = {
+        "from": SENDER_EMAIL,
+        "to": [to],
+        "subject": subject,
+        "html": html_content
+    }
+    async with EMAIL_SEMAPHORE:
+        with outbound_timer(EMAIL_TRANSPORT, "send_email"):
+            await asyncio.wait_for(transport.send(params), EMAIL_TIMEOUT_SECONDS)
+
 async def send_email(to: str, subject: str, html_content: str):
-    """Send email using Resend"""
-    if not RESEND_API_KEY:
+    """Send email through the configured transport"""
+    if get_email_transport() is None:
         logging.warning("Resend API key not configured, skipping email")
         return
     
     try:
-        params = {
-            "from": SENDER_EMAIL,
-            "to": [to],
-            "subject": subject,
-            "html": html_content
-        }
-        await asyncio.to_thread(resend.Emails.send, params)
+        await deliver_email(to, subject, html_content)
     except Exception as e:
-        logging.error(f"Failed to send email: {str(e)}")
+        logging.error(f"Failed to send email: {str(e) or type(e).__name__}")
+
+# Email bodies are Jinja templates under email_templates/, compiled once per worker
+EMAIL_TEMPLATE_DIR = ROOT_DIR / "email_templates"
+email_templates = None
+
+def get_email_templates():
+    """This worker's autoescaping template environment, created on first use"""
+    global email_templates
+    if email_templates is None:
+        from jinja2 import Environment, FileSystemLoader
+        email_templates = Environment(
+            loader=FileSystemLoader(EMAIL_TEMPLATE_DIR),
+            autoescape=True,
+            auto_reload=False,  # templates ship with the code; skip the mtime check on every render
+            cache_size=-1,
+            trim_blocks=True,
+            lstrip_blocks=True
+        )
+    return email_templates
+
+def load_email_templates():
+    """Compile every template up front so the first request doesn't pay for it"""
+    env = get_email_templates()
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
+
+def render_email(template_name: str, **context) -> str:
+    return get_email_templates().get_template(template_name).render(context)
+
+def render_email_batch(template_name: str, contexts: Iterable[dict]) -> Iterator[str]:
+    """Render one template for many recipients, looking it up only once"""
+    template = get_email_templates().get_template(template_name)
+    for context in contexts:
+        yield template.render(context)
+
+class LRUCache:
+    """Small per-worker LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """Returns (hit, value); a cached None is a hit"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    def set(self, key, value, ttl: float):
+        self.entries[key] = (value, time.monotonic() + ttl)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+# Outgoing mail that doesn't need to block the request; processed by email_worker_loop
+EMAIL_QUEUE = asyncio.Queue()
+EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', '4'))
+
+def enqueue_emails(messages: List[tuple]):
+    """Queue (to, subject, html) messages for background delivery"""
+    for message in messages:
+        EMAIL_QUEUE.put_nowait(message)
+
+async def email_worker_loop():
+    while True:
+        message = await EMAIL_QUEUE.get()
+        try:
+            await send_email(*message)
+        except asyncio.CancelledError:
+            # Put it back so the shutdown flush still delivers it
+            EMAIL_QUEUE.put_nowait(message)
+            raise
+        finally:
+            EMAIL_QUEUE.task_done()
+
+async def flush_email_queue():
+    """Deliver whatever is still queued; runs on shutdown"""
+    while not EMAIL_QUEUE.empty():
+        await send_email(*EMAIL_QUEUE.get_nowait())
+        EMAIL_QUEUE.task_done()
 
 def generate_receipt_number() -> str:
     """Generate unique receipt number"""
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
     return f"SM-{timestamp}-{uuid.uuid4().hex[:6].upper()}"
 
+# ==================== RATE LIMITING ====================
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+# "memory" keeps buckets per worker; a file path shares them across workers on one host
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by each rate limit", ("limit",))
+
+class RateLimit(BaseModel):
+    name: str
+    capacity: int  # burst size
+    per_seconds: float  # time to refill the whole bucket
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+def _refill(tokens: float, updated: float, limit: RateLimit, now: float) -> float:
+    return min(limit.capacity, tokens + (now - updated) * limit.refill_rate)
+
+class MemoryBucketStore:
+    """Token buckets held in this worker's memory"""
+    max_keys = 100_000
+
+    def __init__(self):
+        self.buckets = {}
+
+    async def take(self, key: str, limit: RateLimit, now: float) -> float:
+        """Consume a token; returns 0 when allowed, else seconds until one is available"""
+        # Re-inserting keeps the dict in least-recently-used order for eviction
+        tokens, updated = self.buckets.pop(key, (limit.capacity, now))
+        tokens = _refill(tokens, updated, limit, now)
+        wait = 0 if tokens >= 1 else (1 - tokens) / limit.refill_rate
+        self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+        if len(self.buckets) > self.max_keys:
+            del self.buckets[next(iter(self.buckets))]
+        return wait
+
+class SQLiteBucketStore:
+    """Token buckets in a local SQLite file shared by all workers on the host"""
+
+    def __init__(self, path: str):
+        import sqlite3
+        self.conn = sqlite3.connect(path, timeout=1, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    async def take(self, key: str, limit: RateLimit, now: float) -> float:
+        # Waiting on another worker's write lock blocks, so keep it off the event loop
+        return await asyncio.to_thread(self._take, key, limit, now)
+
+    def _take(self, key: str, limit: RateLimit, now: float) -> float:
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = _refill(*row, limit, now) if row else limit.capacity
+                wait = 0 if tokens >= 1 else (1 - tokens) / limit.refill_rate
+                if not wait:
+                    tokens -= 1
+                self.conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (key, tokens, now))
+                self.calls += 1
+                if self.calls % 10_000 == 0:
+                    self.conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 86400,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+_bucket_store = None
+
+def get_bucket_store():
+    # Created lazily so each worker opens its own handle after fork
+    global _bucket_store
+    if _bucket_store is None:
+        _bucket_store = MemoryBucketStore() if RATE_LIMIT_STORE == 'memory' else SQLiteBucketStore(RATE_LIMIT_STORE)
+    return _bucket_store
+
+async def check_rate_limit(limit: RateLimit, key: str) -> float:
+    """Returns 0 when the request may proceed, else the Retry-After in seconds"""
+    if not RATE_LIMIT_ENABLED:
+        return 0
+    wait = await get_bucket_store().take(f"{limit.name}:{key}", limit, time.time())
+    if wait:
+        RATE_LIMIT_REJECTIONS.inc((limit.name,))
+    return wait
+
+async def enforce_rate_limit(limit: RateLimit, key: str):
+    """Raise 429 if `key` is over `limit`; call before any DB or crypto work"""
+    wait = await check_rate_limit(limit, key.lower())
+    if wait:
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": str(int(wait) + 1)})
+
+LOGIN_EMAIL_LIMIT = RateLimit(name="login_email", capacity=5, per_seconds=300)
+ENQUIRY_EMAIL_LIMIT = RateLimit(name="enquiry_email", capacity=3, per_seconds=3600)
+
+# Per-client-IP limits, applied by RateLimitMiddleware before routing or body parsing
+ROUTE_RATE_LIMITS = {
+    ("POST", "/api/auth/login"): RateLimit(name="login_ip", capacity=20, per_seconds=60),
+    ("POST", "/api/auth/register"): RateLimit(name="register_ip", capacity=10, per_seconds=3600),
+    ("POST", "/api/enquiries"): RateLimit(name="enquiry_ip", capacity=5, per_seconds=600),
+    ("POST", "/api/donations/create-order"): RateLimit(name="donation_order_ip", capacity=30, per_seconds=60),
+    ("POST", "/api/upload-image"): RateLimit(name="upload_ip", capacity=20, per_seconds=60),
+    ("POST", "/api/uploads/presign"): RateLimit(name="upload_ip", capacity=20, per_seconds=60),
+}
+
+class RateLimitMiddleware:
+    """Rejects over-limit requests to public write routes with 429 before they reach a handler.
+
+    Uses the ASGI client address. Behind a proxy set FORWARDED_ALLOW_IPS to the proxy's address
+    (or pass --forwarded-allow-ips), otherwise every request shares the proxy's bucket.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            limit = ROUTE_RATE_LIMITS.get((scope['method'], scope['path']))
+            if limit:
+                client_ip = scope['client'][0] if scope.get('client') else "unknown"
+                wait = await check_rate_limit(limit, client_ip)
+                if wait:
+                    response = JSONResponse({"detail": "Too many requests"}, status_code=429,
+                                            headers={"Retry-After": str(int(wait) + 1)})
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+# ==================== ADMISSION CONTROL ====================
+
+# Requests are grouped into classes that each get their own concurrency limit and queue, so a burst of
+# admin exports or page views can't take the worker from payments and logins. When payment latency
+# goes over its SLO, the sheddable classes are cut to half their limit and turned away instead of queued.
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+ADMISSION_SLO_MS = float(os.environ.get('ADMISSION_SLO_MS', '800'))
+ADMISSION_PRESSURE_SECONDS = float(os.environ.get('ADMISSION_PRESSURE_SECONDS', '10'))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.environ.get('ADMISSION_RETRY_AFTER_SECONDS', '2'))
+
+# class -> (concurrent requests, longest wait for a slot in seconds, shed under pressure)
+ADMISSION_CLASSES = {
+    "critical": (int(os.environ.get('ADMISSION_CRITICAL_LIMIT', '64')), 10.0, False),
+    "write": (int(os.environ.get('ADMISSION_WRITE_LIMIT', '32')), 5.0, False),
+    "public_read": (int(os.environ.get('ADMISSION_PUBLIC_READ_LIMIT', '48')), 2.0, True),
+    "admin_bulk": (int(os.environ.get('ADMISSION_ADMIN_BULK_LIMIT', '8')), 5.0, True),
+    "user_read": (int(os.environ.get('ADMISSION_USER_READ_LIMIT', '32')), 5.0, False),
+}
+
+# (methods or None for any, path prefix, class); first match wins, other /api writes are "write".
+# A (admin class, other class) pair is for routes that list everything for admins but only the
+# caller's own rows for anyone else.
+ADMISSION_RULES = [
+    (None, "/api/admin/live", None),  # long-lived stream, bounded by the live feed itself
+    (None, "/api/auth/", "critical"),
+    (None, "/api/donations/create-order", "critical"),
+    (None, "/api/donations/verify-payment", "critical"),
+    (None, "/api/subscriptions", "critical"),
+    (None, "/api/bulk/", "admin_bulk"),
+    (None, "/api/admin/", "admin_bulk"),
+    ({"GET"}, "/api/donations", ("admin_bulk", "user_read")),
+    ({"GET"}, "/api/members", ("admin_bulk", "user_read")),
+    ({"GET"}, "/api/users/members", "admin_bulk"),
+    ({"GET"}, "/api/enquiries", "admin_bulk"),
+    ({"GET"}, "/api/receipts", "admin_bulk"),
+    ({"GET"}, "/api/certificates", ("admin_bulk", "user_read")),
+    ({"GET"}, "/api/expenses", "admin_bulk"),
+    ({"GET"}, "/api/trash/", "admin_bulk"),
+    ({"GET", "HEAD"}, "/api/", "public_read"),
+]
+
+ADMISSION_REJECTIONS = Counter("admission_rejections_total", "Requests turned away by admission control", ("class", "reason"))
+ADMISSION_WAIT = Histogram("admission_queue_wait_seconds", "Time requests waited for an admission slot", ("class",))
+ADMISSION_ACTIVE = Gauge("admission_active_requests", "Admitted requests in progress", ("class",))
+
+def token_role(scope) -> Optional[str]:
+    """Role in the request's bearer token, or None when it has no valid one"""
+    authorization = Headers(scope=scope).get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(authorization[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM]).get('role')
+    except jwt.InvalidTokenError:
+        return None
+
+def admission_class(scope) -> Optional[str]:
+    method, path = scope['method'], scope['path']
+    if method == "OPTIONS" or not path.startswith("/api/"):
+        return None
+    for methods, prefix, name in ADMISSION_RULES:
+        if (methods is None or method in methods) and path.startswith(prefix):
+            if isinstance(name, tuple):
+                return name[0] if token_role(scope) == 'admin' else name[1]
+            return name
+    return "write"
+
+class AdmissionGate:
+    """A FIFO concurrency limit; a released slot goes straight to the longest waiter"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters = deque()
+
+    def try_acquire(self, limit: int) -> bool:
+        if self.active < limit and not self.waiters:
+            self.active += 1
+            return True
+        return False
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.try_acquire(self.limit):
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed a slot just as we gave up
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            raise
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+class AdmissionMiddleware:
+    """Per-class concurrency limits with bounded queues; 503 + Retry-After for requests it won't serve"""
+
+    def __init__(self, app):
+        self.app = app
+        self.gates = {name: AdmissionGate(limit) for name, (limit, _, _) in ADMISSION_CLASSES.items()}
+        self.critical_latency = 0.0  # moving average, seconds
+        self.pressure_until = 0.0
+
+    def under_pressure(self) -> bool:
+        return time.monotonic() < self.pressure_until or bool(self.gates["critical"].waiters)
+
+    async def reject(self, scope, receive, send, name: str, reason: str):
+        ADMISSION_REJECTIONS.inc((name, reason))
+        response = JSONResponse({"detail": "Server busy, please retry"}, status_code=503,
+                                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        name = admission_class(scope) if scope['type'] == 'http' and ADMISSION_ENABLED else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit, queue_timeout, sheddable = ADMISSION_CLASSES[name]
+        gate = self.gates[name]
+        if sheddable and self.under_pressure():
+            # Only what fits in half the class limit right now; nothing queues
+            if not gate.try_acquire(max(1, limit // 2)):
+                await self.reject(scope, receive, send, name, "shed")
+                return
+        else:
+            queued_at = time.perf_counter()
+            try:
+                await gate.acquire(queue_timeout)
+            except asyncio.TimeoutError:
+                await self.reject(scope, receive, send, name, "queue_timeout")
+                return
+            ADMISSION_WAIT.observe((name,), time.perf_counter() - queued_at)
+
+        ADMISSION_ACTIVE.inc((name,))
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+            ADMISSION_ACTIVE.dec((name,))
+            if name == "critical":
+                self.critical_latency = 0.8 * self.critical_latency + 0.2 * (time.perf_counter() - started)
+                if self.critical_latency * 1000 > ADMISSION_SLO_MS:
+                    self.pressure_until = time.monotonic() + ADMISSION_PRESSURE_SECONDS
+
+# ==================== REQUEST PROFILING ====================
+
+# An admin profiles one request by sending it with `X-Profile: 1` or `?profile=1`; PROFILE_SAMPLE_PERCENT
+# also profiles a share of all traffic. While any request is being profiled, a thread samples the event
+# loop: a tick where the request's task is running records its Python stack, any other tick records the
+# await chain it is parked in, so time spent waiting on Mongo or the gateway shows up next to CPU time.
+# With PROFILING_ENABLED=0 the middleware isn't installed at all.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') == '1'
+PROFILE_SAMPLE_PERCENT = float(os.environ.get('PROFILE_SAMPLE_PERCENT', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '50'))
+
+# Finished profiles, newest last; each worker keeps its own
+profile_buffer = deque(maxlen=PROFILE_BUFFER_SIZE)
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+def running_stack(frame, task) -> List[str]:
+    """The loop thread's stack from the task's own coroutine down to the frame being executed"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    root = task.get_coro().cr_frame
+    if root in frames:
+        frames = frames[frames.index(root):]
+    return [frame_label(f) for f in frames]
+
+def await_stack(task) -> List[str]:
+    """The chain of coroutines a suspended task is waiting in, ending with what it awaits"""
+    labels = []
+    awaitable = task.get_coro()
+    while True:
+        frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None)
+        if frame is None:
+            break
+        labels.append(frame_label(frame))
+        awaitable = getattr(awaitable, 'cr_await', None) or getattr(awaitable, 'gi_yieldfrom', None)
+    labels.append(f"[await {type(awaitable).__name__}]")
+    return labels
+
+class RequestProfile:
+    def __init__(self, task, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.task = task
+        self.method, self.path, self.trigger = method, path, trigger
+        self.started = time.perf_counter()
+        self.stacks = {}  # folded stack -> samples
+        self.running_samples = 0
+        self.await_samples = 0
+
+    def add(self, labels: List[str], running: bool):
+        stack = ";".join(labels)
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        if running:
+            self.running_samples += 1
+        else:
+            self.await_samples += 1
+
+    def finish(self, status_code: int, route: Optional[str]) -> dict:
+        # Called after stack_sampler.stop(); the lock waits out a tick that is still adding a sample
+        with stack_sampler.lock:
+            stacks = dict(self.stacks)
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status_code,
+            "trigger": self.trigger,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "running_samples": self.running_samples,
+            "await_samples": self.await_samples,
+            "stacks": stacks,
+            "pid": os.getpid(),
+            "created_at": datetime.now(timezone.utc)
+        }
+
+class StackSampler:
+    """Samples the event loop thread for the requests being profiled; the thread exits when there are none"""
+
+    def __init__(self):
+        self.profiles = {}  # task -> RequestProfile
+        self.thread = None
+        self.loop = None
+        self.loop_thread_id = None
+        self.lock = threading.Lock()
+
+    def start(self, profile: RequestProfile):
+        with self.lock:
+            self.profiles[profile.task] = profile
+            if self.thread is None:
+                self.loop = asyncio.get_running_loop()
+                self.loop_thread_id = threading.get_ident()
+                self.thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+                self.thread.start()
+
+    def stop(self, profile: RequestProfile):
+        with self.lock:
+            self.profiles.pop(profile.task, None)
+
+    def run(self):
+        while True:
+            time.sleep(PROFILE_INTERVAL_MS / 1000)
+            # Held while sampling, so no sample lands on a profile after stop() returns
+            with self.lock:
+                if not self.profiles:
+                    self.thread = None
+                    return
+                running = asyncio.current_task(self.loop)
+                frame = sys._current_frames().get(self.loop_thread_id)
+                for profile in self.profiles.values():
+                    if profile.task is running and frame is not None:
+                        profile.add(running_stack(frame, profile.task), running=True)
+                    else:
+                        profile.add(await_stack(profile.task), running=False)
+
+stack_sampler = StackSampler()
+
+def profile_trigger(scope) -> Optional[str]:
+    """Why this request should be profiled, or None; only admins can ask for it"""
+    asked = any(name == b"x-profile" and value == b"1" for name, value in scope['headers'])
+    if not asked and b"profile=" in scope['query_string']:
+        asked = re.search(rb"(^|&)profile=1(&|$)", scope['query_string']) is not None
+    if asked:
+        return "request" if token_role(scope) == 'admin' else None
+    if PROFILE_SAMPLE_PERCENT and random.random() * 100 < PROFILE_SAMPLE_PERCENT:
+        return "sample"
+    return None
+
+class ProfilingMiddleware:
+    """Profiles the requests picked by profile_trigger() and answers them with an X-Profile-Id header.
+
+    Must be the innermost middleware, so it runs in the same task as the route handler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        trigger = profile_trigger(scope) if scope['type'] == 'http' else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(asyncio.current_task(), scope['method'], scope['path'], trigger)
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                MutableHeaders(scope=message)['X-Profile-Id'] = profile.id
+            await send(message)
+
+        stack_sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            stack_sampler.stop(profile)
+            route = getattr(scope.get('route'), 'path_format', None)
+            profile_buffer.append(profile.finish(status_code, route))
+
+@api_router.get("/admin/profiles")
+async def list_profiles(user_data: dict = Depends(verify_token)):
+    """Profiles held by the worker that answers; look for a profile on the worker that served it"""
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    return [{k: v for k, v in p.items() if k != "stacks"} for p in reversed(profile_buffer)]
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: Literal["folded", "json"] = "folded", user_data: dict = Depends(verify_token)):
+    """Collapsed stacks (`frame;frame;frame count`), as read by flamegraph.pl, inferno and speedscope"""
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    profile = next((p for p in profile_buffer if p['id'] == profile_id), None)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found on this worker")
+    if format == "json":
+        return profile
+    root = f"{profile['method']} {profile['route'] or profile['path']}".replace(";", ",")
+    lines = [f"{root};{stack} {count}" for stack, count in sorted(profile['stacks'].items())]
+    return PlainTextResponse("\n".join(lines) + "\n")
+
+# ==================== RESPONSE COMPRESSION ====================
+
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', '1') == '1'
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+# Server preference when the client rates several encodings equally
+COMPRESSION_PREFERENCE = [e for e in os.environ.get('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',')
+                          if e == 'gzip' or importlib.util.find_spec({'br': 'brotli', 'zstd': 'zstandard'}.get(e, e))]
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+# Per-request compression favours speed. Cached bodies are compressed once per TTL, but still on the
+# event loop, so they stop short of the slowest levels (br 11 took ~60 ms on /api/home for ~10% fewer bytes)
+COMPRESSION_LEVELS = {
+    "gzip": {"dynamic": 6, "cached": 9},
+    "br": {"dynamic": 4, "cached": 9},
+    "zstd": {"dynamic": 3, "cached": 19},
+}
+
+COMPRESSION_BYTES = Counter("http_compression_bytes_total", "Response bytes before and after compression",
+                            ("encoding", "stage"))
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header, or None for identity"""
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    ranked = [(weights.get(e, weights.get("*", 0.0)), -i, e) for i, e in enumerate(COMPRESSION_PREFERENCE)]
+    q, _, encoding = max(ranked, default=(0.0, 0, None))
+    return encoding if q > 0 else None
+
+def compress_body(encoding: str, body: bytes, mode: str = "dynamic") -> bytes:
+    level = COMPRESSION_LEVELS[encoding][mode]
+    if encoding == "br":
+        import brotli
+        compressed = brotli.compress(body, quality=level)
+    elif encoding == "zstd":
+        import zstandard
+        compressed = zstandard.ZstdCompressor(level=level).compress(body)
+    else:
+        compressed = gzip.compress(body, compresslevel=level, mtime=0)
+    COMPRESSION_BYTES.inc((encoding, "original"), len(body))
+    COMPRESSION_BYTES.inc((encoding, "compressed"), len(compressed))
+    return compressed
+
+class EncodedBody:
+    """A rendered JSON body that keeps each compressed variant once it has been built"""
+
+    def __init__(self, payload):
+        # Same rendering as JSONResponse
+        self.body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        self.variants = {}
+
+    def response(self, request: Request, headers: dict) -> Response:
+        headers = {**headers, "Vary": "Accept-Encoding"}
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is None or len(self.body) < COMPRESSION_MIN_BYTES:
+            return Response(self.body, media_type="application/json", headers=headers)
+        if encoding not in self.variants:
+            self.variants[encoding] = compress_body(encoding, self.body, "cached")
+        return Response(self.variants[encoding], media_type="application/json",
+                        headers={**headers, "Content-Encoding": encoding})
+
+class CompressionMiddleware:
+    """Compress buffered text/JSON responses; event streams, files and small bodies pass through untouched"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or content_type.startswith("text/event-stream")  # must reach the client as it's written
+                    or int(headers.get("content-length", COMPRESSION_MIN_BYTES)) < COMPRESSION_MIN_BYTES
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+            # Responses behind BaseHTTPMiddleware arrive in several chunks, so collect the whole body first
+            chunks.append(message.get('body', b''))
+            if message.get('more_body'):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start['headers'])
+            if len(body) >= COMPRESSION_MIN_BYTES:
+                body = compress_body(encoding, body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_compressed)
+
+# ==================== LIVE ADMIN FEED ====================
+
+# "auto" tails change streams when Mongo is a replica set, else uses the in-process bus
+LIVE_FEED_SOURCE = os.environ.get('LIVE_FEED_SOURCE', 'auto')
+LIVE_FEED_QUEUE_SIZE = int(os.environ.get('LIVE_FEED_QUEUE_SIZE', '256'))
+LIVE_FEED_HISTORY = int(os.environ.get('LIVE_FEED_HISTORY', '1000'))
+# Streams end after this long; EventSource reconnects (with Last-Event-ID) and may land on another worker
+LIVE_FEED_MAX_SECONDS = int(os.environ.get('LIVE_FEED_MAX_SECONDS', '300'))
+
+# Only these fields are pushed to admin clients
+LIVE_FEED_FIELDS = {
+    "donations": ("id", "donor_name", "amount", "status", "campaign_id", "receipt_number", "created_at"),
+    "enquiries": ("id", "name", "email", "status", "created_at"),
+    "users": ("id", "name", "email", "role", "is_active", "created_at"),
+    "members": ("id", "user_id", "member_number", "designation", "city", "status", "joined_at"),
+    "broadcasts": ("id", "subject", "status", "total", "sent", "failed"),
+}
+
+LIVE_FEED_SUBSCRIBERS = Gauge("live_feed_subscribers", "Connected live feed clients")
+LIVE_FEED_OVERFLOWS = Counter("live_feed_overflows_total", "Slow live feed clients told to resync")
+
+class LiveFeed:
+    """Fans change events out to connected admin clients.
+
+    Each client gets a bounded queue; a client that falls behind has its queue
+    replaced by a single resync event instead of slowing down everyone else.
+    Recent events are kept so reconnecting clients can resume by event id.
+    """
+
+    def __init__(self):
+        self.source = "bus"
+        self.subscribers = set()
+        self.history = deque(maxlen=LIVE_FEED_HISTORY)
+        self.seq = 0
+        self.closed = False
+
+    def publish(self, collection: str, operation: str, document: dict, event_id: Optional[str] = None):
+        fields = LIVE_FEED_FIELDS.get(collection)
+        if fields is None:
+            return
+        if event_id is None:
+            self.seq += 1
+            event_id = f"{os.getpid()}-{self.seq}"
+        payload = {
+            "collection": collection,
+            "operation": operation,
+            "document": {k: document[k] for k in fields if k in document}
+        }
+        frame = f"id: {event_id}\nevent: change\ndata: {json.dumps(jsonable_encoder(payload))}\n\n"
+        self.history.append((event_id, frame))
+        for queue in list(self.subscribers):
+            self._offer(queue, frame)
+
+    def _offer(self, queue: asyncio.Queue, frame: str):
+        try:
+            queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            LIVE_FEED_OVERFLOWS.inc()
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait("event: resync\ndata: {}\n\n")
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=LIVE_FEED_QUEUE_SIZE)
+        if last_event_id:
+            ids = [event_id for event_id, _ in self.history]
+            if last_event_id in ids:
+                for _, frame in list(self.history)[ids.index(last_event_id) + 1:]:
+                    self._offer(queue, frame)
+            else:
+                queue.put_nowait("event: resync\ndata: {}\n\n")
+        if self.closed:
+            queue.put_nowait(None)  # shutting down; the client reconnects to another worker
+        self.subscribers.add(queue)
+        LIVE_FEED_SUBSCRIBERS.inc()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self.subscribers:
+            self.subscribers.discard(queue)
+            LIVE_FEED_SUBSCRIBERS.dec()
+
+    def close(self):
+        """Ask every open stream to finish, and any opened later to end at once, e.g. on shutdown"""
+        self.closed = True
+        for queue in list(self.subscribers):
+            while queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+live_feed = LiveFeed()
+
+def publish_change(collection: str, operation: str, document: dict):
+    """Called by write routes; a no-op when change streams are the source"""
+    if live_feed.source == "bus":
+        live_feed.publish(collection, operation, document)
+
+async def live_feed_loop():
+    """Tail change streams for the feed collections when the deployment supports them"""
+    if LIVE_FEED_SOURCE == "bus":
+        return
+    if LIVE_FEED_SOURCE == "auto":
+        hello = await db.command('hello')
+        if 'setName' not in hello:
+            logger.info("Live feed: no replica set, using in-process event bus")
+            return
+
+    live_feed.source = "change_stream"
+    # Routes only soft delete; hard deletes are the archiver and trash purge moving rows out, and their
+    # events carry just the Mongo _id, so they are left out
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(LIVE_FEED_FIELDS)},
+        "operationType": {"$in": ["insert", "update", "replace"]}
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = change['_id']
+                    document = change.get('fullDocument')
+                    if not document:
+                        continue  # removed before the update could be looked up
+                    # A soft delete reaches the stream as an update; name it as the event bus does
+                    operation = "delete" if document.get('deleted_at') else change['operationType']
+                    live_feed.publish(change['ns']['coll'], operation, document, event_id=resume_token['_data'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Live feed change stream failed, resuming: %s", e)
+            await asyncio.sleep(1)
+
+@api_router.get("/admin/live")
+async def live_admin_feed(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Server-Sent Events stream of new donations, enquiries, registrations and member changes.
+
+    EventSource can't send headers, so the JWT may also be passed as ?token=.
+    """
+    raw_token = token or (credentials.credentials if credentials else None)
+    if not raw_token:
+        raise HTTPException(status_code=401, detail="Missing token")
+    user_data = await verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=raw_token))
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+
+    queue = live_feed.subscribe(request.headers.get('last-event-id'))
+
+    async def stream():
+        deadline = time.monotonic() + LIVE_FEED_MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=min(15, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            live_feed.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register")
@@ -317,9 +1629,9 @@ async def register(user_data: UserRegister):
         is_active=False
     )
 
-    doc = user.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = to_storage("users", user.model_dump())
     await db.users.insert_one(doc)
+    publish_change("users", "insert", doc)
 
     token = create_jwt_token(user.id, user.email, user.role)
 
@@ -335,6 +1647,7 @@ async def register(user_data: UserRegister):
 
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
+    await enforce_rate_limit(LOGIN_EMAIL_LIMIT, credentials.email)
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
     if not user or not verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -362,27 +1675,80 @@ async def create_member(
     # Generate member number
     member_count = await db.members.count_documents({})
     member_number = f"SM{str(member_count + 1).zfill(6)}"
-    
+
+    # Materialize the referral chain so downline queries are a single indexed match
+    member_data.pop('ancestors', None)
+    ancestors = []
+    if member_data.get('referrer_id'):
+        referrer = await find_referrer(member_data['referrer_id'])
+        if not referrer:
+            raise HTTPException(status_code=400, detail="Invalid referrer")
+        member_data['referrer_id'] = referrer['id']
+        ancestors = referrer.get('ancestors', []) + [referrer['id']]
+
     member = Member(
         user_id=user_data['user_id'],
         member_number=member_number,
+        ancestors=ancestors,
         **member_data
     )
     
-    doc = member.model_dump()
-    doc['joined_at'] = doc['joined_at'].isoformat()
+    doc = to_storage("members", member.model_dump())
     await db.members.insert_one(doc)
+    publish_change("members", "insert", doc)
     
     return {"message": "Membership application submitted", "member_number": member_number}
 
 @api_router.get("/members")
 async def get_members(user_data: dict = Depends(verify_token)):
     if user_data['role'] == 'admin':
-        members = await db.members.find({}, {"_id": 0}).to_list(1000)
+        members = await db.members.find({"deleted_at": None}, {"_id": 0}).to_list(1000)
     else:
-        members = await db.members.find({"user_id": user_data['user_id']}, {"_id": 0}).to_list(10)
+        members = await db.members.find({"user_id": user_data['user_id'], "deleted_at": None}, {"_id": 0}).to_list(10)
     return members
 
+MEMBER_SORT_FIELDS = {"joined_at", "member_number", "status", "designation", "city"}
+
+@api_router.get("/admin/members")
+async def get_member_profiles(
+    status: Optional[str] = None,
+    designation: Optional[str] = None,
+    city: Optional[str] = None,
+    sort: str = "joined_at",
+    order: str = "desc",
+    skip: int = 0,
+    limit: int = 50,
+    user_data: dict = Depends(verify_token)
+):
+    """Members joined with their user accounts, filtered, sorted and paged server-side"""
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    if sort not in MEMBER_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of {sorted(MEMBER_SORT_FIELDS)}")
+
+    query = {"deleted_at": None}
+    if status:
+        query['status'] = status
+    if designation:
+        query['designation'] = designation
+    if city:
+        query['city'] = city
+    limit = max(1, min(limit, 200))
+
+    # Filter, sort and page on indexed member fields first so the join only touches one page
+    pipeline = [
+        {"$match": query},
+        {"$sort": {sort: -1 if order == "desc" else 1, "id": 1}},
+        {"$skip": max(skip, 0)},
+        {"$limit": limit},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+        {"$project": {"_id": 0, "ancestors": 0, "user._id": 0, "user.password_hash": 0}}
+    ]
+    total = await db.members.count_documents(query)
+    items = await db.members.aggregate(pipeline).to_list(limit)
+    return {"total": total, "skip": skip, "limit": limit, "items": items}
+
 @api_router.patch("/members/{member_id}/status")
 async def update_member_status(
     member_id: str,
@@ -393,8 +1759,124 @@ async def update_member_status(
         raise HTTPException(status_code=403, detail="Only admins can update status")
     
     await db.members.update_one({"id": member_id}, {"$set": {"status": status}})
+    publish_change("members", "update", {"id": member_id, "status": status})
     return {"message": "Status updated"}
 
+# ==================== REFERRAL ROUTES ====================
+
+REFERRAL_LEADERBOARD_SIZE = int(os.environ.get('REFERRAL_LEADERBOARD_SIZE', '100'))
+REFERRAL_LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('REFERRAL_LEADERBOARD_REFRESH_SECONDS', '600'))
+
+async def find_referrer(referrer: str) -> Optional[dict]:
+    """Resolve a referrer given either its member id or member number"""
+    return await db.members.find_one(
+        {"$or": [{"id": referrer}, {"member_number": referrer}], "deleted_at": None},
+        {"_id": 0, "id": 1, "ancestors": 1}
+    )
+
+async def refresh_referral_leaderboard() -> int:
+    """Recompute the top referrers into the referral_leaderboard collection"""
+    stats = {}
+
+    # Downline size per ancestor; direct referrals are the ones whose referrer is that ancestor
+    downline = db.members.aggregate([
+        {"$match": {"ancestors.0": {"$exists": True}, "deleted_at": None}},
+        {"$unwind": "$ancestors"},
+        {"$group": {
+            "_id": "$ancestors",
+            "downline_size": {"$sum": 1},
+            "direct_referrals": {"$sum": {"$cond": [{"$eq": ["$referrer_id", "$ancestors"]}, 1, 0]}}
+        }}
+    ])
+    async for row in downline:
+        stats[row['_id']] = {
+            "downline_size": row['downline_size'],
+            "direct_referrals": row['direct_referrals'],
+            "network_donation_total": 0,
+            "network_donation_count": 0
+        }
+
+    raised = db.donations.aggregate([
+        {"$match": {"status": "completed", "referrer_path.0": {"$exists": True}, "deleted_at": None}},
+        {"$unwind": "$referrer_path"},
+        {"$group": {"_id": "$referrer_path", **paise_total("amount"), "count": {"$sum": 1}}}
+    ])
+    async for row in raised:
+        entry = stats.setdefault(row['_id'], {"downline_size": 0, "direct_referrals": 0})
+        entry['network_donation_total'] = rupees(row)
+        entry['network_donation_count'] = row['count']
+
+    top = sorted(
+        stats.items(),
+        key=lambda item: (item[1]['network_donation_total'], item[1]['downline_size']),
+        reverse=True
+    )[:REFERRAL_LEADERBOARD_SIZE]
+
+    members = await db.members.find(
+        {"id": {"$in": [member_id for member_id, _ in top]}},
+        {"_id": 0, "id": 1, "member_number": 1, "user_id": 1}
+    ).to_list(REFERRAL_LEADERBOARD_SIZE)
+    members = {m['id']: m for m in members}
+    users = await db.users.find(
+        {"id": {"$in": [m['user_id'] for m in members.values()]}},
+        {"_id": 0, "id": 1, "name": 1}
+    ).to_list(REFERRAL_LEADERBOARD_SIZE)
+    names = {u['id']: u['name'] for u in users}
+
+    refreshed_at = datetime.now(timezone.utc)
+    ops = []
+    for rank, (member_id, entry) in enumerate(top, start=1):
+        member = members.get(member_id, {})
+        ops.append(ReplaceOne({"rank": rank}, {
+            "rank": rank,
+            "member_id": member_id,
+            "member_number": member.get('member_number'),
+            "name": names.get(member.get('user_id')),
+            **entry,
+            "refreshed_at": refreshed_at
+        }, upsert=True))
+    if ops:
+        await db.referral_leaderboard.bulk_write(ops, ordered=False)
+    await db.referral_leaderboard.delete_many({"rank": {"$gt": len(ops)}})
+    return len(ops)
+
+@api_router.get("/referrals/leaderboard")
+async def get_referral_leaderboard(limit: int = 20):
+    limit = max(1, min(limit, REFERRAL_LEADERBOARD_SIZE))
+    leaderboard = await db.referral_leaderboard.find({}, {"_id": 0}).sort("rank", 1).to_list(limit)
+    return leaderboard
+
+@api_router.post("/referrals/leaderboard/refresh")
+async def refresh_leaderboard(user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can refresh the leaderboard")
+    count = await refresh_referral_leaderboard()
+    return {"message": "Leaderboard refreshed", "entries": count}
+
+@api_router.get("/referrals/{member_id}")
+async def get_referral_stats(member_id: str, user_data: dict = Depends(verify_token)):
+    member = await db.members.find_one({"id": member_id, "deleted_at": None}, {"_id": 0, "id": 1, "user_id": 1, "member_number": 1})
+    if not member:
+        raise HTTPException(status_code=404, detail="Member not found")
+    if user_data['role'] != 'admin' and member['user_id'] != user_data['user_id']:
+        raise HTTPException(status_code=403, detail="Not allowed to view this member's referrals")
+
+    downline_size = await db.members.count_documents({"ancestors": member_id, "deleted_at": None})
+    direct_referrals = await db.members.count_documents({"referrer_id": member_id, "deleted_at": None})
+    raised = await db.donations.aggregate([
+        {"$match": {"referrer_path": member_id, "status": "completed", "deleted_at": None}},
+        {"$group": {"_id": None, **paise_total("amount"), "count": {"$sum": 1}}}
+    ]).to_list(1)
+
+    return {
+        "member_id": member_id,
+        "member_number": member['member_number'],
+        "downline_size": downline_size,
+        "direct_referrals": direct_referrals,
+        "network_donation_total": rupees(raised[0] if raised else None),
+        "network_donation_count": raised[0]['count'] if raised else 0
+    }
+
 # ==================== DONATION ROUTES ====================
 
 # @api_router.post("/donations/create-order")
@@ -437,12 +1919,10 @@ async def update_member_status(
 #     }
 
 
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from razorpay.errors import BadRequestError
-
 @api_router.post("/donations/create-order")
 async def create_donation_order(donation_data: dict):
     # 1) payment gateway configured?
+    razorpay_client = get_razorpay_client()
     if not razorpay_client:
         raise HTTPException(status_code=500, detail="Payment gateway not configured")
 
@@ -470,12 +1950,15 @@ async def create_donation_order(donation_data: dict):
     if not isinstance(amount_in_paise, int):
         raise HTTPException(status_code=400, detail="Failed to convert amount to integer paise")
 
+    from razorpay.errors import BadRequestError  # already loaded along with the client
+
     try:
-        razor_order = razorpay_client.order.create({
-            "amount": amount_in_paise,
-            "currency": "INR",
-            "payment_capture": 1
-        })
+        with outbound_timer("razorpay", "order_create"):
+            razor_order = razorpay_client.order.create({
+                "amount": amount_in_paise,
+                "currency": "INR",
+                "payment_capture": 1
+            })
     except BadRequestError as e:
         logging.exception("Razorpay BadRequestError: %s", e)
         # return the gateway message (400) so frontend can show it
@@ -487,6 +1970,14 @@ async def create_donation_order(donation_data: dict):
     # continue saving donation record
     receipt_number = generate_receipt_number()
 
+    referrer_member_id = None
+    referrer_path = []
+    if donation_data.get('referrer_member_id'):
+        referrer = await find_referrer(donation_data['referrer_member_id'])
+        if referrer:
+            referrer_member_id = referrer['id']
+            referrer_path = referrer.get('ancestors', []) + [referrer['id']]
+
     donation = Donation(
         donor_name=donation_data.get('donor_name', ''),
         donor_email=donation_data.get('donor_email', ''),
@@ -496,13 +1987,15 @@ async def create_donation_order(donation_data: dict):
         order_id=razor_order['id'],
         receipt_number=receipt_number,
         purpose=donation_data.get('purpose'),
+        referrer_member_id=referrer_member_id,
+        referrer_path=referrer_path,
         campaign_id=donation_data.get('campaign_id'),
         status="pending"
     )
 
-    doc = donation.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = to_storage("donations", donation.model_dump())
     await db.donations.insert_one(doc)
+    publish_change("donations", "insert", doc)
 
     return {
         "order_id": razor_order['id'],
@@ -519,42 +2012,488 @@ async def verify_donation_payment(payment_data: dict):
     donation = await db.donations.find_one({"order_id": payment_data['order_id']}, {"_id": 0})
     if not donation:
         raise HTTPException(status_code=404, detail="Donation not found")
+
+    client = get_razorpay_client()
+    if not client:
+        raise HTTPException(status_code=500, detail="Payment gateway not configured")
+    from razorpay.errors import SignatureVerificationError
+    try:
+        # The route is public, so only a payment signed by the gateway may complete the order
+        client.utility.verify_payment_signature({
+            "razorpay_order_id": payment_data['order_id'],
+            "razorpay_payment_id": payment_data['payment_id'],
+            "razorpay_signature": payment_data.get('signature', ''),
+        })
+    except SignatureVerificationError:
+        raise HTTPException(status_code=400, detail="Invalid payment signature")
     
     # Update donation status
-    await db.donations.update_one(
-        {"order_id": payment_data['order_id']},
-        {"$set": {"status": "completed", "payment_id": payment_data['payment_id']}}
+    completed = await db.donations.update_one(
+        {"order_id": payment_data['order_id'], "status": {"$ne": "completed"}},
+        {"$set": {"status": "completed", "payment_id": payment_data['payment_id'], "completed_at": datetime.now(timezone.utc)}}
     )
+    key = donor_key(donation.get('donor_email'), donation.get('donor_phone'))
+    if completed.modified_count and key:
+        # Only the call that completes the donation counts it towards the donor's totals
+        await db.donor_profiles.bulk_write([donor_gift(donation, key)])
+    publish_change("donations", "update", {**donation, "status": "completed"})
+    verification_cache.pop(("receipt", donation['receipt_number']))
     
     # Generate QR code for receipt
     qr_data = f"https://starmarketing.in/verify-receipt/{donation['receipt_number']}"
     qr_image = generate_qr_code(qr_data)
     
     # Send receipt email
-    html_content = f"""
-    <h2>Thank You for Your Donation!</h2>
-    <p>Dear {donation['donor_name']},</p>
-    <p>We have received your generous donation of ₹{donation['amount']}.</p>
-    <p><strong>Receipt Number:</strong> {donation['receipt_number']}</p>
-    <p><strong>Payment ID:</strong> {payment_data['payment_id']}</p>
-    <p><strong>Date:</strong> {donation['created_at']}</p>
-    <p>This donation is eligible for 80G tax benefits.</p>
-    <img src="{qr_image}" alt="QR Code" />
-    <p>Scan this QR code to verify your receipt.</p>
-    <p>Thank you for supporting NVP Welfare Foundation India!</p>
-    """
+    html_content = render_email(
+        "donation_receipt.html",
+        name=donation['donor_name'],
+        amount=donation['amount'],
+        receipt_number=donation['receipt_number'],
+        payment_id=payment_data['payment_id'],
+        date=donation['created_at'],
+        qr_image=qr_image
+    )
     await send_email(donation['donor_email'], "Donation Receipt - NVP Welfare Foundation", html_content)
     
     return {"message": "Payment verified and receipt sent", "receipt_number": donation['receipt_number']}
 
 @api_router.get("/donations")
-async def get_donations(user_data: dict = Depends(verify_token)):
+async def get_donations(user_data: dict = Depends(verify_token), projection: dict = Depends(fieldset(Donation))):
     if user_data['role'] == 'admin':
-        donations = await db.donations.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+        donations = await db.donations.find({"deleted_at": None}, projection).sort("created_at", -1).to_list(1000)
     else:
-        donations = await db.donations.find({"donor_email": user_data['email']}, {"_id": 0}).sort("created_at", -1).to_list(100)
+        donations = await db.donations.find({"donor_email": user_data['email'], "deleted_at": None}, projection).sort("created_at", -1).to_list(100)
     return donations
 
+# ==================== DONOR PROFILES ====================
+
+# One document per donor with lifetime totals, kept current by donor_gift() as each payment completes,
+# so donor lookups and top-donor rankings never group the donations collection.
+
+def donor_key(email: Optional[str], phone: Optional[str]) -> Optional[str]:
+    """Profile key: the normalised email, or the last ten phone digits when there is no email"""
+    if email and email.strip():
+        return f"email:{email.strip().lower()}"
+    digits = re.sub(r"\D", "", phone or "")
+    return f"phone:{digits[-10:]}" if digits else None
+
+def donor_gift(donation: dict, key: str) -> UpdateOne:
+    """Upsert that adds one completed donation to its donor's profile"""
+    given_at = parse_stored_date(donation['created_at'])
+    paise = to_paise(donation['amount'])
+    update = {
+        "$setOnInsert": {"key": key},
+        "$set": {
+            "name": donation.get('donor_name'),
+            "email": (donation.get('donor_email') or "").strip().lower() or None,
+            "phone": donation.get('donor_phone')
+        },
+        "$inc": {"lifetime_paise": paise, "donation_count": 1},
+        "$min": {"first_gift_at": given_at},
+        "$max": {"last_gift_at": given_at, "largest_gift_paise": paise}
+    }
+    if donation.get('campaign_id'):
+        update['$addToSet'] = {"campaign_ids": donation['campaign_id']}
+    return UpdateOne({"key": key}, update, upsert=True)
+
+def donor_view(profile: dict) -> dict:
+    profile['lifetime_total'] = profile.get('lifetime_paise', 0) / 100
+    profile['largest_gift'] = profile.get('largest_gift_paise', 0) / 100
+    return profile
+
+@api_router.get("/donors/me")
+async def get_my_donor_profile(user_data: dict = Depends(verify_token)):
+    profile = await db.donor_profiles.find_one({"key": donor_key(user_data['email'], None)}, {"_id": 0})
+    if not profile:
+        raise HTTPException(status_code=404, detail="No donations yet")
+    return donor_view(profile)
+
+@api_router.get("/admin/donors/top")
+async def get_top_donors(limit: int = 20, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    limit = max(1, min(limit, 500))
+    donors = await db.donor_profiles.find({}, {"_id": 0}).sort("lifetime_paise", -1).to_list(limit)
+    return [donor_view(d) for d in donors]
+
+@api_router.get("/admin/donors/lookup")
+async def lookup_donor(email: Optional[str] = None, phone: Optional[str] = None, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    key = donor_key(email, phone)
+    if not key:
+        raise HTTPException(status_code=400, detail="Give an email or phone")
+    profile = await db.donor_profiles.find_one({"key": key}, {"_id": 0})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Donor not found")
+    return donor_view(profile)
+
+async def replay_gifts(collection, query: dict) -> set:
+    """Apply donor_gift() for every donation matching `query`; returns the donor keys touched"""
+    ops, keys = [], set()
+    donations = db.donations.find(
+        {"status": "completed", "deleted_at": None, **query},
+        {"_id": 0, "donor_name": 1, "donor_email": 1, "donor_phone": 1, "amount": 1, "campaign_id": 1, "created_at": 1}
+    ).sort("created_at", 1)
+    async for donation in donations:
+        key = donor_key(donation.get('donor_email'), donation.get('donor_phone'))
+        if not key:
+            continue
+        keys.add(key)
+        ops.append(donor_gift(donation, key))
+        if len(ops) >= 1000:
+            await collection.bulk_write(ops, ordered=True)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=True)
+    return keys
+
+@api_router.post("/admin/donors/rebuild")
+async def rebuild_donor_profiles(user_data: dict = Depends(verify_token)):
+    """Recompute every profile from completed donations, for backfill or after deletions.
+
+    Profiles are built in a staging collection that replaces donor_profiles when done. Payments
+    completed during the build were counted in the profiles the swap drops, so they are replayed after it.
+    """
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    started = datetime.now(timezone.utc)
+    staging = db.donor_profiles_rebuild
+    await staging.drop()
+    await staging.create_index("key", unique=True)
+    await staging.create_index([("lifetime_paise", -1)])
+    keys = await replay_gifts(staging, {"$or": [{"completed_at": None}, {"completed_at": {"$lt": started}}]})
+
+    swapped_at = datetime.now(timezone.utc)
+    await staging.rename("donor_profiles", dropTarget=True)
+    late = await replay_gifts(db.donor_profiles, {"completed_at": {"$gte": started, "$lt": swapped_at}})
+    return {"message": "Donor profiles rebuilt", "donors": len(keys | late)}
+
+# ==================== SUBSCRIPTIONS ====================
+
+# Monthly gifts on a Razorpay recurring mandate. The donor authorises the mandate with a first
+# payment at checkout; after that the charge_subscriptions job charges each due subscription.
+SUBSCRIPTION_BATCH_SIZE = int(os.environ.get('SUBSCRIPTION_BATCH_SIZE', '200'))
+# Gateway calls block, so they run on their own small pool instead of the request threadpool
+SUBSCRIPTION_CHARGE_CONCURRENCY = int(os.environ.get('SUBSCRIPTION_CHARGE_CONCURRENCY', '8'))
+SUBSCRIPTION_CALL_RETRIES = int(os.environ.get('SUBSCRIPTION_CALL_RETRIES', '3'))
+SUBSCRIPTION_RETRY_HOURS = int(os.environ.get('SUBSCRIPTION_RETRY_HOURS', '24'))
+SUBSCRIPTION_MAX_FAILURES = int(os.environ.get('SUBSCRIPTION_MAX_FAILURES', '3'))
+SUBSCRIPTION_CHARGE_HOUR = int(os.environ.get('SUBSCRIPTION_CHARGE_HOUR', '4'))  # UTC
+
+gateway_executor = None
+
+def get_gateway_executor() -> ThreadPoolExecutor:
+    global gateway_executor
+    if gateway_executor is None:
+        gateway_executor = ThreadPoolExecutor(max_workers=SUBSCRIPTION_CHARGE_CONCURRENCY, thread_name_prefix="gateway")
+    return gateway_executor
+
+async def close_gateway_executor():
+    global gateway_executor
+    if gateway_executor is not None:
+        gateway_executor.shutdown(wait=False, cancel_futures=True)
+        gateway_executor = None
+
+class Subscription(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    donor_name: str
+    donor_email: EmailStr
+    donor_phone: str
+    amount: float = Field(gt=0)
+    charge_day: int = Field(default=1, ge=1, le=28)
+    campaign_id: Optional[str] = None
+    purpose: Optional[str] = None
+    status: str = "pending_mandate"  # pending_mandate, active, paused, halted, cancelled
+    donor_key: Optional[str] = None
+    customer_id: Optional[str] = None
+    mandate_order_id: Optional[str] = None
+    token_id: Optional[str] = None
+    # The month ("2025-03") the next charge pays for; retries move next_charge_at but never this
+    charge_period: Optional[str] = None
+    next_charge_at: Optional[datetime] = None
+    last_charged_at: Optional[datetime] = None
+    failed_attempts: int = 0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class SubscriptionActivation(BaseModel):
+    payment_id: str
+
+def next_period(period: str) -> str:
+    year, month = map(int, period.split("-"))
+    return f"{year + month // 12}-{month % 12 + 1:02d}"
+
+def period_charge_date(period: str, charge_day: int) -> datetime:
+    year, month = map(int, period.split("-"))
+    return datetime(year, month, charge_day, SUBSCRIPTION_CHARGE_HOUR, tzinfo=timezone.utc)
+
+def charge_period(subscription: dict) -> str:
+    # Subscriptions scheduled before charge_period was stored are charging the month they are due in
+    return subscription.get('charge_period') or parse_stored_date(subscription['next_charge_at']).strftime("%Y-%m")
+
+def gateway_call(operation: str, call, *args):
+    """Make a blocking Razorpay call, retrying server and network errors with backoff"""
+    import requests
+    from razorpay.errors import ServerError, GatewayError
+    for attempt in range(SUBSCRIPTION_CALL_RETRIES + 1):
+        try:
+            with outbound_timer("razorpay", operation):
+                return call(*args)
+        except (ServerError, GatewayError, requests.RequestException):
+            if attempt == SUBSCRIPTION_CALL_RETRIES:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+async def run_gateway(operation: str, call, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_gateway_executor(), gateway_call, operation, call, *args)
+
+def subscription_donation(subscription: dict, period: str) -> dict:
+    """The pending donation for one month of a subscription; charge_key makes it unique per month"""
+    donation = Donation(
+        donor_name=subscription['donor_name'],
+        donor_email=subscription['donor_email'],
+        donor_phone=subscription['donor_phone'],
+        amount=subscription['amount'],
+        payment_method="mandate",
+        receipt_number=generate_receipt_number(),
+        purpose=subscription.get('purpose'),
+        campaign_id=subscription.get('campaign_id'),
+        subscription_id=subscription['id']
+    )
+    return {**to_storage("donations", donation.model_dump()), "charge_key": f"{subscription['id']}:{period}"}
+
+def charge_mandate(subscription: dict, donation: dict) -> dict:
+    """Charge one month on the gateway pool; returns the payment and receipt QR, or the error"""
+    client = get_razorpay_client()
+    try:
+        # An earlier attempt may have been paid without its outcome being recorded
+        payments = gateway_call("order_payments", client.order.payments, donation['order_id'])
+        paid = [p['id'] for p in payments.get('items', []) if p['status'] in ("authorized", "captured")]
+        payment_id = paid[0] if paid else None
+        if payment_id is None:
+            payment = gateway_call("payment_recurring", client.payment.createRecurring, {
+                "email": subscription['donor_email'],
+                "contact": subscription['donor_phone'],
+                "amount": to_paise(subscription['amount']),
+                "currency": "INR",
+                "order_id": donation['order_id'],
+                "customer_id": subscription['customer_id'],
+                "token": subscription['token_id'],
+                "recurring": "1",
+                "description": f"Monthly donation {donation['receipt_number']}"
+            })
+            payment_id = payment['razorpay_payment_id']
+    except Exception as e:
+        return {"error": str(e)}
+    qr_image = generate_qr_code(f"https://starmarketing.in/verify-receipt/{donation['receipt_number']}")
+    return {"payment_id": payment_id, "qr_image": qr_image}
+
+async def prepare_charges(subscriptions: List[dict]) -> List[dict]:
+    """One donation per subscription for the month being charged, with a gateway order attached"""
+    charges = [subscription_donation(sub, charge_period(sub)) for sub in subscriptions]
+    try:
+        await db.donations.insert_many(charges, ordered=False)
+    except BulkWriteError:
+        pass  # months an earlier run already started; picked up below
+    existing = await db.donations.find(
+        {"charge_key": {"$in": [c['charge_key'] for c in charges]}}, {"_id": 0}
+    ).to_list(len(charges))
+    existing = {d['charge_key']: d for d in existing}
+    donations = [existing[c['charge_key']] for c in charges]
+
+    client = get_razorpay_client()
+    # Months that failed before are retried on their existing order
+    retries = [d for d in donations if d['status'] == "failed" and d.get('order_id')]
+    needs_order = [d for d in donations if d['status'] in ("pending", "failed") and not d.get('order_id')]
+    orders = await asyncio.gather(*(
+        run_gateway("order_create", client.order.create, {
+            "amount": to_paise(d['amount']), "currency": "INR", "receipt": d['receipt_number'], "payment_capture": 1
+        }) for d in needs_order
+    ), return_exceptions=True)
+    updates = []
+    for donation in retries:
+        donation['status'] = "charging"
+        updates.append(UpdateOne({"id": donation['id']}, {"$set": {"status": "charging"}}))
+    for donation, order in zip(needs_order, orders):
+        if isinstance(order, Exception):
+            donation['order_error'] = str(order)
+            continue
+        donation['order_id'] = order['id']
+        donation['status'] = "charging"
+        updates.append(UpdateOne({"id": donation['id']}, {"$set": {"order_id": order['id'], "status": "charging"}}))
+    # Record the orders before charging, so a crash after this point can't charge a month twice
+    if updates:
+        await db.donations.bulk_write(updates, ordered=False)
+    return donations
+
+async def run_gateway_charge(subscription: dict, donation: dict) -> dict:
+    if donation['status'] == "completed":
+        return {"already_charged": True}
+    if donation.get('order_error') or not donation.get('order_id'):
+        return {"error": donation.get('order_error') or f"Donation is {donation['status']}"}
+    return await asyncio.get_running_loop().run_in_executor(get_gateway_executor(), charge_mandate, subscription, donation)
+
+async def charge_due_subscriptions() -> dict:
+    """Charge every active subscription that is due, a batch at a time"""
+    totals = {"charged": 0, "failed": 0}
+    if not get_razorpay_client():
+        return totals
+    while True:
+        now = datetime.now(timezone.utc)
+        due = await db.subscriptions.find(
+            {"status": "active", "next_charge_at": {"$lte": now}}, {"_id": 0}
+        ).sort("next_charge_at", 1).to_list(SUBSCRIPTION_BATCH_SIZE)
+        if not due:
+            return totals
+
+        donations = await prepare_charges(due)
+        results = await asyncio.gather(*(
+            run_gateway_charge(sub, donation) for sub, donation in zip(due, donations)
+        ))
+
+        donation_ops, subscription_ops, profile_ops, receipts = [], [], [], []
+        for sub, donation, result in zip(due, donations, results):
+            upcoming = next_period(charge_period(sub))
+            schedule = {"charge_period": upcoming, "next_charge_at": period_charge_date(upcoming, sub['charge_day'])}
+            if result.get('already_charged'):
+                # The month was paid by an earlier run that stopped before moving the schedule on
+                subscription_ops.append(UpdateOne({"id": sub['id']}, {"$set": {**schedule, "failed_attempts": 0}}))
+            elif result.get('payment_id'):
+                donation_ops.append(UpdateOne(
+                    {"id": donation['id'], "status": {"$ne": "completed"}},
+                    {"$set": {"status": "completed", "payment_id": result['payment_id'], "completed_at": now}}
+                ))
+                subscription_ops.append(UpdateOne({"id": sub['id']}, {
+                    "$set": {**schedule, "last_charged_at": now, "failed_attempts": 0},
+                    "$inc": {"charged_count": 1, "charged_paise": to_paise(sub['amount'])}
+                }))
+                key = donor_key(donation['donor_email'], donation['donor_phone'])
+                if key:
+                    profile_ops.append(donor_gift(donation, key))
+                receipts.append((donation, result))
+                totals['charged'] += 1
+            else:
+                failures = sub.get('failed_attempts', 0) + 1
+                donation_ops.append(UpdateOne(
+                    {"id": donation['id'], "status": {"$ne": "completed"}},
+                    {"$set": {"status": "failed", "failure_reason": result['error']}}
+                ))
+                subscription_ops.append(UpdateOne({"id": sub['id']}, {"$set": {
+                    "failed_attempts": failures,
+                    "status": "halted" if failures >= SUBSCRIPTION_MAX_FAILURES else "active",
+                    # Retry the same month later; charge_period moves on only after success
+                    "charge_period": charge_period(sub),
+                    "next_charge_at": now + timedelta(hours=SUBSCRIPTION_RETRY_HOURS)
+                }}))
+                totals['failed'] += 1
+
+        await asyncio.gather(
+            *([db.donations.bulk_write(donation_ops, ordered=False)] if donation_ops else []),
+            db.subscriptions.bulk_write(subscription_ops, ordered=False),
+            *([db.donor_profiles.bulk_write(profile_ops, ordered=False)] if profile_ops else [])
+        )
+        if receipts:
+            bodies = render_email_batch("donation_receipt.html", (
+                {"name": d['donor_name'], "amount": d['amount'], "receipt_number": d['receipt_number'],
+                 "payment_id": r['payment_id'], "date": now.strftime("%d %B %Y"), "qr_image": r['qr_image']}
+                for d, r in receipts
+            ))
+            enqueue_emails([(d['donor_email'], "Donation Receipt - NVP Welfare Foundation", html) for (d, _), html in zip(receipts, bodies)])
+
+@api_router.post("/subscriptions")
+async def create_subscription(subscription_data: dict):
+    """Start a monthly gift; the returned order is paid at checkout with recurring=1 to set up the mandate"""
+    client = get_razorpay_client()
+    if not client:
+        raise HTTPException(status_code=500, detail="Payment gateway not configured")
+    subscription = Subscription(**{**subscription_data, "status": "pending_mandate"})
+    paise = to_paise(subscription.amount)
+
+    from razorpay.errors import BadRequestError
+    try:
+        customer = await run_gateway("customer_create", client.customer.create, {
+            "name": subscription.donor_name, "email": subscription.donor_email,
+            "contact": subscription.donor_phone, "fail_existing": "0"
+        })
+        order = await run_gateway("order_create", client.order.create, {
+            "amount": paise,
+            "currency": "INR",
+            "customer_id": customer['id'],
+            "payment_capture": 1,
+            "token": {"max_amount": paise, "frequency": "monthly",
+                      "expire_at": int((datetime.now(timezone.utc) + timedelta(days=3650)).timestamp())}
+        })
+    except BadRequestError as e:
+        raise HTTPException(status_code=400, detail=f"Payment gateway error: {str(e)}")
+
+    subscription.donor_key = donor_key(subscription.donor_email, None)
+    subscription.customer_id = customer['id']
+    subscription.mandate_order_id = order['id']
+    await db.subscriptions.insert_one(to_storage("subscriptions", subscription.model_dump()))
+    return {
+        "subscription_id": subscription.id,
+        "order_id": order['id'],
+        "customer_id": customer['id'],
+        "amount": paise,
+        "currency": "INR",
+        "key": RAZORPAY_KEY_ID
+    }
+
+@api_router.post("/subscriptions/{subscription_id}/activate")
+async def activate_subscription(subscription_id: str, payment_data: SubscriptionActivation):
+    """Called after the mandate checkout; the authorising payment counts as the first month"""
+    subscription = await db.subscriptions.find_one({"id": subscription_id}, {"_id": 0})
+    if not subscription:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    if subscription['status'] != "pending_mandate":
+        return {"message": "Subscription already active", "status": subscription['status']}
+
+    payment = await run_gateway("payment_fetch", get_razorpay_client().payment.fetch, payment_data.payment_id)
+    if (payment.get('order_id') != subscription['mandate_order_id'] or not payment.get('token_id')
+            or payment.get('status') not in ("authorized", "captured")):
+        raise HTTPException(status_code=400, detail="Payment does not authorise this subscription")
+
+    now = datetime.now(timezone.utc)
+    # The authorising payment pays for this month, so scheduled charges start with the next one
+    period = now.strftime("%Y-%m")
+    upcoming = next_period(period)
+    activated = await db.subscriptions.update_one(
+        {"id": subscription_id, "status": "pending_mandate"},
+        {"$set": {"status": "active", "token_id": payment['token_id'], "last_charged_at": now, "charge_period": upcoming,
+                  "next_charge_at": period_charge_date(upcoming, subscription['charge_day'])},
+         "$inc": {"charged_count": 1, "charged_paise": to_paise(subscription['amount'])}}
+    )
+    if activated.modified_count:
+        donation = {**subscription_donation(subscription, period), "status": "completed", "completed_at": now,
+                    "order_id": subscription['mandate_order_id'], "payment_id": payment['id']}
+        await db.donations.insert_one(donation)
+        key = donor_key(donation['donor_email'], donation['donor_phone'])
+        if key:
+            await db.donor_profiles.bulk_write([donor_gift(donation, key)])
+    return {"message": "Subscription activated", "status": "active"}
+
+@api_router.post("/subscriptions/{subscription_id}/cancel")
+async def cancel_subscription(subscription_id: str, user_data: dict = Depends(verify_token)):
+    subscription = await db.subscriptions.find_one({"id": subscription_id}, {"_id": 0, "donor_key": 1, "donor_email": 1})
+    if not subscription:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    owner = subscription.get('donor_key') or donor_key(subscription['donor_email'], None)
+    if user_data['role'] != 'admin' and owner != donor_key(user_data['email'], None):
+        raise HTTPException(status_code=403, detail="Not allowed to cancel this subscription")
+    await db.subscriptions.update_one(
+        {"id": subscription_id}, {"$set": {"status": "cancelled", "next_charge_at": None, "cancelled_at": datetime.now(timezone.utc)}}
+    )
+    return {"message": "Subscription cancelled"}
+
+@api_router.get("/subscriptions")
+async def get_subscriptions(status: Optional[str] = None, user_data: dict = Depends(verify_token)):
+    projection = {"_id": 0, "customer_id": 0, "token_id": 0}
+    if user_data['role'] != 'admin':
+        return await db.subscriptions.find({"donor_key": donor_key(user_data['email'], None)}, projection).to_list(50)
+    query = {"status": status} if status else {}
+    return await db.subscriptions.find(query, projection).sort("created_at", -1).to_list(1000)
+
 # ==================== CERTIFICATE ROUTES ====================
 
 @api_router.post("/certificates")
@@ -579,37 +2518,34 @@ async def generate_certificate(
         issued_by=user_data['user_id']
     )
     
-    doc = certificate.model_dump()
-    doc['issue_date'] = doc['issue_date'].isoformat()
+    doc = to_storage("certificates", certificate.model_dump())
     await db.certificates.insert_one(doc)
+    verification_cache.pop(("certificate", cert_number))
     
     # Send certificate email
-    html_content = f"""
-    <h2>Certificate Issued</h2>
-    <p>Dear {certificate.recipient_name},</p>
-    <p>Your certificate has been issued successfully.</p>
-    <p><strong>Certificate Number:</strong> {cert_number}</p>
-    <p><strong>Type:</strong> {certificate.certificate_type}</p>
-    <p>You can download your certificate from your dashboard.</p>
-    """
+    html_content = render_email(
+        "certificate_issued.html",
+        name=certificate.recipient_name,
+        certificate_number=cert_number,
+        certificate_type=certificate.certificate_type
+    )
     await send_email(certificate.recipient_email, "Certificate Issued - NVP Welfare Foundation", html_content)
     
     return {"message": "Certificate generated", "certificate_number": cert_number}
 
 @api_router.get("/certificates")
-async def get_certificates(user_data: dict = Depends(verify_token)):
+async def get_certificates(user_data: dict = Depends(verify_token), projection: dict = Depends(fieldset(Certificate))):
     if user_data['role'] == 'admin':
-        certificates = await db.certificates.find({}, {"_id": 0}).to_list(1000)
+        certificates = await db.certificates.find({"deleted_at": None}, projection).to_list(1000)
     else:
-        certificates = await db.certificates.find({"recipient_email": user_data['email']}, {"_id": 0}).to_list(100)
+        certificates = await db.certificates.find({"recipient_email": user_data['email'], "deleted_at": None}, projection).to_list(100)
     return certificates
 
 @api_router.delete("/certificates/{certificate_id}")
 async def delete_certificate(certificate_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete certificates")
-    result = await db.certificates.delete_one({"id": certificate_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("certificates", certificate_id):
         raise HTTPException(status_code=404, detail="Certificate not found")
     return {"message": "Certificate deleted successfully"}
 
@@ -639,16 +2575,16 @@ async def create_news(news_data: dict, user_data: dict = Depends(verify_token)):
         author_id=user_data['user_id']
     )
 
-    doc = news.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = to_storage("news", news.model_dump())
     await db.news.insert_one(doc)
+    invalidate_home("news")
 
     return {"message": "News published", "id": news.id}
 
 
 @api_router.get("/news")
-async def get_news():
-    news_list = await db.news.find({"published": True}, {"_id": 0}).sort("created_at", -1).to_list(100)
+async def get_news(projection: dict = Depends(fieldset(News))):
+    news_list = await db.news.find({"published": True, "deleted_at": None}, projection).sort("created_at", -1).to_list(100)
     return news_list
 
 @api_router.delete("/news/{news_id}")
@@ -656,8 +2592,7 @@ async def delete_news(news_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete news")
     
-    result = await db.news.delete_one({"id": news_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("news", news_id):
         raise HTTPException(status_code=404, detail="News not found")
     return {"message": "News deleted successfully"}
 
@@ -669,14 +2604,14 @@ async def create_activity(activity_data: dict, user_data: dict = Depends(verify_
         raise HTTPException(status_code=403, detail="Only admins can post activities")
     
     activity = Activity(author_id=user_data['user_id'], **activity_data)
-    doc = activity.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = to_storage("activities", activity.model_dump())
     await db.activities.insert_one(doc)
+    invalidate_home("activities")
     return {"message": "Activity posted", "id": activity.id}
 
 @api_router.get("/activities")
-async def get_activities():
-    activities = await db.activities.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+async def get_activities(projection: dict = Depends(fieldset(Activity))):
+    activities = await db.activities.find({"deleted_at": None}, projection).sort("created_at", -1).to_list(100)
     return activities
 
 @api_router.delete("/activities/{activity_id}")
@@ -684,8 +2619,7 @@ async def delete_activity(activity_id: str, user_data: dict = Depends(verify_tok
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete activities")
     
-    result = await db.activities.delete_one({"id": activity_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("activities", activity_id):
         raise HTTPException(status_code=404, detail="Activity not found")
     return {"message": "Activity deleted successfully"}
 
@@ -697,16 +2631,16 @@ async def create_campaign(campaign_data: dict, user_data: dict = Depends(verify_
         raise HTTPException(status_code=403, detail="Only admins can create campaigns")
     
     campaign = Campaign(**campaign_data)
-    doc = campaign.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['start_date'] = doc['start_date'].isoformat() if isinstance(doc['start_date'], datetime) else doc['start_date']
-    doc['end_date'] = doc['end_date'].isoformat() if isinstance(doc['end_date'], datetime) else doc['end_date']
+    doc = to_storage("campaigns", campaign.model_dump())
     await db.campaigns.insert_one(doc)
+    invalidate_home("campaigns")
+    if doc.get('end_date'):
+        await schedule_once("expire_campaigns", doc['end_date'])
     return {"message": "Campaign created", "id": campaign.id}
 
 @api_router.get("/campaigns")
-async def get_campaigns():
-    campaigns = await db.campaigns.find({"status": "active"}, {"_id": 0}).to_list(100)
+async def get_campaigns(projection: dict = Depends(fieldset(Campaign))):
+    campaigns = await db.campaigns.find({"status": "active", "deleted_at": None}, projection).to_list(100)
     return campaigns
 
 @api_router.delete("/campaigns/{campaign_id}")
@@ -714,8 +2648,7 @@ async def delete_campaign(campaign_id: str, user_data: dict = Depends(verify_tok
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete campaigns")
     
-    result = await db.campaigns.delete_one({"id": campaign_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("campaigns", campaign_id):
         raise HTTPException(status_code=404, detail="Campaign not found")
     return {"message": "Campaign deleted successfully"}
 
@@ -724,17 +2657,13 @@ async def delete_campaign(campaign_id: str, user_data: dict = Depends(verify_tok
 @api_router.post("/enquiries")
 async def create_enquiry(enquiry_data: dict):
     enquiry = Enquiry(**enquiry_data)
-    doc = enquiry.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    await enforce_rate_limit(ENQUIRY_EMAIL_LIMIT, enquiry.email)
+    doc = to_storage("enquiries", enquiry.model_dump())
     await db.enquiries.insert_one(doc)
+    publish_change("enquiries", "insert", doc)
     
     # Auto-reply email
-    html_content = f"""
-    <h2>Thank You for Your Enquiry!</h2>
-    <p>Dear {enquiry.name},</p>
-    <p>We have received your enquiry and will get back to you soon.</p>
-    <p>Your message: {enquiry.message}</p>
-    """
+    html_content = render_email("enquiry_received.html", name=enquiry.name, message=enquiry.message)
     await send_email(enquiry.email, "Enquiry Received - NVP Welfare Foundation", html_content)
     
     return {"message": "Enquiry submitted successfully"}
@@ -746,6 +2675,26 @@ async def get_enquiries(user_data: dict = Depends(verify_token)):
     enquiries = await db.enquiries.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return enquiries
 
+ENQUIRY_STATUSES = ("pending", "replied")
+
+@api_router.patch("/enquiries/{enquiry_id}/status")
+async def update_enquiry_status(
+    enquiry_id: str,
+    status: str,
+    user_data: dict = Depends(verify_token)
+):
+    """Replied enquiries move to the archive after ENQUIRY_ARCHIVE_DAYS"""
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can update status")
+    if status not in ENQUIRY_STATUSES:
+        raise HTTPException(status_code=400, detail="Status must be pending or replied")
+
+    result = await db.enquiries.update_one({"id": enquiry_id}, {"$set": {"status": status}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Enquiry not found")
+    publish_change("enquiries", "update", {"id": enquiry_id, "status": status})
+    return {"message": "Status updated"}
+
 @api_router.get("/users/members")
 async def get_member_users(user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
@@ -768,23 +2717,22 @@ async def create_beneficiary(beneficiary_data: dict, user_data: dict = Depends(v
         raise HTTPException(status_code=403, detail="Only admins can add beneficiaries")
     
     beneficiary = Beneficiary(**beneficiary_data)
-    doc = beneficiary.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = to_storage("beneficiaries", beneficiary.model_dump())
     await db.beneficiaries.insert_one(doc)
     return {"message": "Beneficiary added successfully", "id": beneficiary.id}
 
 @api_router.get("/beneficiaries")
-async def get_beneficiaries(user_data: dict = Depends(verify_token)):
+async def get_beneficiaries(user_data: dict = Depends(verify_token), projection: dict = Depends(fieldset(Beneficiary))):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can view beneficiaries")
-    beneficiaries = await db.beneficiaries.find({}, {"_id": 0}).to_list(1000)
+    beneficiaries = await db.beneficiaries.find({"deleted_at": None}, projection).to_list(1000)
     return beneficiaries
 
 @api_router.get("/beneficiaries/{beneficiary_id}")
 async def get_beneficiary(beneficiary_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can view beneficiaries")
-    beneficiary = await db.beneficiaries.find_one({"id": beneficiary_id}, {"_id": 0})
+    beneficiary = await db.beneficiaries.find_one({"id": beneficiary_id, "deleted_at": None}, {"_id": 0})
     if not beneficiary:
         raise HTTPException(status_code=404, detail="Beneficiary not found")
     return beneficiary
@@ -793,8 +2741,7 @@ async def get_beneficiary(beneficiary_id: str, user_data: dict = Depends(verify_
 async def delete_beneficiary(beneficiary_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete beneficiaries")
-    result = await db.beneficiaries.delete_one({"id": beneficiary_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("beneficiaries", beneficiary_id):
         raise HTTPException(status_code=404, detail="Beneficiary not found")
     return {"message": "Beneficiary deleted successfully"}
 
@@ -806,23 +2753,21 @@ async def create_event(event_data: dict, user_data: dict = Depends(verify_token)
         raise HTTPException(status_code=403, detail="Only admins can create events")
     
     event = Event(**event_data)
-    doc = event.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['event_date'] = doc['event_date'].isoformat() if isinstance(doc['event_date'], datetime) else doc['event_date']
+    doc = to_storage("events", event.model_dump())
     await db.events.insert_one(doc)
+    invalidate_home("events")
     return {"message": "Event created", "id": event.id}
 
 @api_router.get("/events")
-async def get_events():
-    events = await db.events.find({}, {"_id": 0}).sort("event_date", 1).to_list(100)
+async def get_events(projection: dict = Depends(fieldset(Event))):
+    events = await db.events.find({"deleted_at": None}, projection).sort("event_date", 1).to_list(100)
     return events
 
 @api_router.delete("/events/{event_id}")
 async def delete_event(event_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete events")
-    result = await db.events.delete_one({"id": event_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("events", event_id):
         raise HTTPException(status_code=404, detail="Event not found")
     return {"message": "Event deleted successfully"}
 
@@ -834,28 +2779,165 @@ async def create_project(project_data: dict, user_data: dict = Depends(verify_to
         raise HTTPException(status_code=403, detail="Only admins can create projects")
     
     project = Project(**project_data)
-    doc = project.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['start_date'] = doc['start_date'].isoformat() if isinstance(doc['start_date'], datetime) else doc['start_date']
-    if doc.get('end_date'):
-        doc['end_date'] = doc['end_date'].isoformat() if isinstance(doc['end_date'], datetime) else doc['end_date']
+    doc = to_storage("projects", project.model_dump())
+    doc['remaining'] = project.budget - project.spent
     await db.projects.insert_one(doc)
     return {"message": "Project created", "id": project.id}
 
 @api_router.get("/projects")
-async def get_projects(user_data: dict = Depends(verify_token)):
-    projects = await db.projects.find({}, {"_id": 0}).to_list(1000)
+async def get_projects(user_data: dict = Depends(verify_token), projection: dict = Depends(fieldset(Project))):
+    projects = await db.projects.find({"deleted_at": None}, projection).to_list(1000)
     return projects
 
 @api_router.delete("/projects/{project_id}")
 async def delete_project(project_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete projects")
-    result = await db.projects.delete_one({"id": project_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("projects", project_id):
         raise HTTPException(status_code=404, detail="Project not found")
     return {"message": "Project deleted successfully"}
 
+# ==================== EXPENSE ROUTES ====================
+
+# The ledger is append-only: a mistake is corrected by a reversing entry, never by editing or deleting.
+# Each entry is rolled into its project with a single $inc, so spent, remaining and the category
+# breakdown on the project stay current without reading the ledger back.
+
+def expense_rollup(expense: Expense) -> dict:
+    return {
+        "$inc": {
+            "spent": expense.amount,
+            "spent_paise": to_paise(expense.amount),
+            "remaining": -expense.amount,
+            f"spent_paise_by_category.{expense.category}": to_paise(expense.amount),
+            "expense_count": 1
+        },
+        "$max": {"last_expense_at": expense.expense_date}
+    }
+
+async def record_expense(expense: Expense):
+    if expense.project_id:
+        project = await db.projects.find_one(
+            {"id": expense.project_id, "deleted_at": None}, {"_id": 0, "budget": 1, "spent": 1, "remaining": 1}
+        )
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        if 'remaining' not in project:
+            # Projects created before the ledger have no remaining field for $inc to move
+            await db.projects.update_one(
+                {"id": expense.project_id, "remaining": {"$exists": False}},
+                {"$set": {"remaining": project['budget'] - project.get('spent', 0)}}
+            )
+
+    try:
+        await db.expenses.insert_one(to_storage("expenses", expense.model_dump()))
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Expense has already been reversed")
+    if expense.project_id:
+        await db.projects.update_one({"id": expense.project_id}, expense_rollup(expense))
+
+@api_router.post("/expenses")
+async def create_expense(expense_data: dict, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can add expenses")
+    expense = Expense(**{**expense_data, "reverses": None, "recorded_by": user_data['user_id']})
+    if expense.amount <= 0:
+        raise HTTPException(status_code=400, detail="Amount must be positive")
+    await record_expense(expense)
+    return {"message": "Expense added", "id": expense.id}
+
+@api_router.post("/expenses/{expense_id}/reverse")
+async def reverse_expense(expense_id: str, reason: Optional[dict] = None, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can reverse expenses")
+    original = await db.expenses.find_one({"id": expense_id, "reverses": None}, {"_id": 0})
+    if not original:
+        raise HTTPException(status_code=404, detail="Expense not found")
+
+    reversal = Expense(
+        project_id=original.get('project_id'),
+        category=original['category'],
+        amount=-original['amount'],
+        description=(reason or {}).get('description') or f"Reversal of {expense_id}",
+        reverses=expense_id,
+        recorded_by=user_data['user_id']
+    )
+    await record_expense(reversal)
+    return {"message": "Expense reversed", "id": reversal.id}
+
+@api_router.get("/expenses")
+async def get_expenses(
+    project_id: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = 200,
+    user_data: dict = Depends(verify_token),
+    projection: dict = Depends(fieldset(Expense))
+):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    query = {}
+    if project_id:
+        query['project_id'] = project_id
+    if category:
+        query['category'] = category
+    expenses = await db.expenses.find(query, projection).sort("expense_date", -1).to_list(min(max(limit, 1), 1000))
+    return expenses
+
+@api_router.get("/projects/utilisation")
+async def get_budget_utilisation(user_data: dict = Depends(verify_token)):
+    """Budget use across all projects, read from the rollups kept by the expense ledger"""
+    projects = await db.projects.find(
+        {"deleted_at": None},
+        {"_id": 0, "id": 1, "title": 1, "status": 1, "budget": 1, "spent": 1, "spent_paise": 1, "spent_paise_by_category": 1}
+    ).to_list(1000)
+
+    total_budget = total_spent = 0
+    for project in projects:
+        # The paise rollups are exact; the rupee ones collect float error over many $inc
+        paise = project.pop('spent_paise', None)
+        project['spent'] = paise / 100 if paise is not None else project.get('spent', 0)
+        project['remaining'] = round(project['budget'] - project['spent'], 2)
+        by_category = project.pop('spent_paise_by_category', {})
+        project['spent_by_category'] = {category: amount / 100 for category, amount in by_category.items()}
+        project['utilisation'] = round(100 * project['spent'] / project['budget'], 1) if project['budget'] else None
+        total_budget += project['budget']
+        total_spent += project['spent']
+
+    projects.sort(key=lambda p: p['utilisation'] or 0, reverse=True)
+    return {
+        "total_budget": total_budget,
+        "total_spent": round(total_spent, 2),
+        "total_remaining": round(total_budget - total_spent, 2),
+        "utilisation": round(100 * total_spent / total_budget, 1) if total_budget else None,
+        "projects": projects
+    }
+
+@api_router.post("/admin/projects/{project_id}/reconcile")
+async def reconcile_project_spend(project_id: str, user_data: dict = Depends(verify_token)):
+    """Rebuild a project's rollups from its ledger entries"""
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    project = await db.projects.find_one({"id": project_id}, {"_id": 0, "budget": 1})
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    rows = await db.expenses.aggregate([
+        {"$match": {"project_id": project_id}},
+        {"$group": {"_id": "$category", **paise_total("amount"), "count": {"$sum": 1}, "last": {"$max": "$expense_date"}}}
+    ]).to_list(None)
+    by_category = {row['_id']: row['paise'] + round(row['legacy'] * 100) for row in rows}
+    spent = sum(by_category.values()) / 100
+    rollup = {
+        "spent": spent,
+        "spent_paise": sum(by_category.values()),
+        "remaining": round(project['budget'] - spent, 2),
+        "spent_paise_by_category": by_category,
+        "expense_count": sum(row['count'] for row in rows),
+        "last_expense_at": max((row['last'] for row in rows), default=None)
+    }
+    await db.projects.update_one({"id": project_id}, {"$set": rollup})
+    return {"message": "Project reconciled", **rollup}
+
 # ==================== INTERNSHIP ROUTES ====================
 
 @api_router.post("/internships")
@@ -864,28 +2946,26 @@ async def create_internship(internship_data: dict, user_data: dict = Depends(ver
         raise HTTPException(status_code=403, detail="Only admins can create internships")
     
     internship = Internship(**internship_data)
-    doc = internship.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = to_storage("internships", internship.model_dump())
     await db.internships.insert_one(doc)
     return {"message": "Internship created", "id": internship.id}
 
 @api_router.get("/internships")
-async def get_internships():
-    internships = await db.internships.find({}, {"_id": 0}).to_list(1000)
+async def get_internships(projection: dict = Depends(fieldset(Internship))):
+    internships = await db.internships.find({"deleted_at": None}, projection).to_list(1000)
     return internships
 
 @api_router.delete("/internships/{internship_id}")
 async def delete_internship(internship_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete internships")
-    result = await db.internships.delete_one({"id": internship_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("internships", internship_id):
         raise HTTPException(status_code=404, detail="Internship not found")
     return {"message": "Internship deleted successfully"}
 
 @api_router.post("/internships/{internship_id}/apply")
 async def apply_internship(internship_id: str, application_data: dict, user_data: dict = Depends(verify_token)):
-    internship = await db.internships.find_one({"id": internship_id}, {"_id": 0})
+    internship = await db.internships.find_one({"id": internship_id, "deleted_at": None}, {"_id": 0})
     if not internship:
         raise HTTPException(status_code=404, detail="Internship not found")
     
@@ -913,22 +2993,20 @@ async def create_designation(designation_data: dict, user_data: dict = Depends(v
         raise HTTPException(status_code=403, detail="Only admins can create designations")
     
     designation = Designation(**designation_data)
-    doc = designation.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = to_storage("designations", designation.model_dump())
     await db.designations.insert_one(doc)
     return {"message": "Designation created", "id": designation.id}
 
 @api_router.get("/designations")
 async def get_designations():
-    designations = await db.designations.find({}, {"_id": 0}).to_list(1000)
+    designations = await db.designations.find({"deleted_at": None}, {"_id": 0}).to_list(1000)
     return designations
 
 @api_router.delete("/designations/{designation_id}")
 async def delete_designation(designation_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete designations")
-    result = await db.designations.delete_one({"id": designation_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("designations", designation_id):
         raise HTTPException(status_code=404, detail="Designation not found")
     return {"message": "Designation deleted successfully"}
 
@@ -952,22 +3030,23 @@ async def create_receipt(receipt_data: dict, user_data: dict = Depends(verify_to
         "amount": receipt_data.get('amount', 0),
         "description": receipt_data.get('description'),
         "qr_data": qr_data,
-        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_at": datetime.now(timezone.utc),
         "created_by": user_data['user_id']
     }
     
-    await db.receipts.insert_one(receipt)
+    await db.receipts.insert_one(to_storage("receipts", receipt))
+    verification_cache.pop(("receipt", receipt_number))
     
     # Send receipt email
-    html_content = f"""
-    <h2>Receipt - NVP Welfare Foundation India</h2>
-    <p>Dear {receipt['recipient_name']},</p>
-    <p><strong>Receipt Number:</strong> {receipt_number}</p>
-    <p><strong>Type:</strong> {receipt['receipt_type']}</p>
-    <p><strong>Amount:</strong> ₹{receipt['amount']}</p>
-    <p><strong>Description:</strong> {receipt['description']}</p>
-    <img src="{qr_image}" alt="QR Code" />
-    """
+    html_content = render_email(
+        "receipt.html",
+        name=receipt['recipient_name'],
+        receipt_number=receipt_number,
+        receipt_type=receipt['receipt_type'],
+        amount=receipt['amount'],
+        description=receipt['description'],
+        qr_image=qr_image
+    )
     await send_email(receipt['recipient_email'], f"Receipt - {receipt_number}", html_content)
     
     return {"message": "Receipt generated", "receipt_number": receipt_number}
@@ -976,31 +3055,118 @@ async def create_receipt(receipt_data: dict, user_data: dict = Depends(verify_to
 async def get_receipts(user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can view receipts")
-    receipts = await db.receipts.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    receipts = await db.receipts.find({"deleted_at": None}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return receipts
 
 @api_router.delete("/receipts/{receipt_id}")
 async def delete_receipt(receipt_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete receipts")
-    result = await db.receipts.delete_one({"id": receipt_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("receipts", receipt_id):
         raise HTTPException(status_code=404, detail="Receipt not found")
     return {"message": "Receipt deleted successfully"}
 
+# ==================== VERIFICATION ROUTES ====================
+
+VERIFY_CACHE_SIZE = int(os.environ.get('VERIFY_CACHE_SIZE', '10000'))
+VERIFY_POSITIVE_TTL = int(os.environ.get('VERIFY_POSITIVE_TTL', '300'))
+# Kept short so a freshly issued document verifies soon on every worker
+VERIFY_NEGATIVE_TTL = int(os.environ.get('VERIFY_NEGATIVE_TTL', '30'))
+VERIFY_CACHE_LOOKUPS = Counter("verification_cache_lookups_total", "Verification lookups by cache result", ("kind", "result"))
+verification_cache = LRUCache(VERIFY_CACHE_SIZE)
+
+def mask_name(name: Optional[str]) -> Optional[str]:
+    """'Ravi Kumar' -> 'R*** K***'"""
+    if not name:
+        return None
+    return " ".join(f"{part[0]}***" for part in name.split())
+
+async def lookup_receipt(receipt_number: str) -> Optional[dict]:
+    donation = await db.donations.find_one(
+        {"receipt_number": receipt_number, "status": "completed", "deleted_at": None},
+        {"_id": 0, "donor_name": 1, "amount": 1, "created_at": 1, "is_80g_eligible": 1}
+    )
+    if donation:
+        return {
+            "valid": True,
+            "receipt_number": receipt_number,
+            "receipt_type": "donation",
+            "name": mask_name(donation.get('donor_name')),
+            "amount": donation.get('amount'),
+            "issued_on": str(donation.get('created_at', ''))[:10],
+            "is_80g_eligible": donation.get('is_80g_eligible', True)
+        }
+    receipt = await db.receipts.find_one(
+        {"receipt_number": receipt_number, "deleted_at": None},
+        {"_id": 0, "receipt_type": 1, "recipient_name": 1, "amount": 1, "created_at": 1}
+    )
+    if receipt:
+        return {
+            "valid": True,
+            "receipt_number": receipt_number,
+            "receipt_type": receipt.get('receipt_type'),
+            "name": mask_name(receipt.get('recipient_name')),
+            "amount": receipt.get('amount'),
+            "issued_on": str(receipt.get('created_at', ''))[:10]
+        }
+    return None
+
+async def lookup_certificate(cert_number: str) -> Optional[dict]:
+    certificate = await db.certificates.find_one(
+        {"certificate_number": cert_number, "deleted_at": None},
+        {"_id": 0, "certificate_type": 1, "recipient_name": 1, "issue_date": 1}
+    )
+    if not certificate:
+        return None
+    return {
+        "valid": True,
+        "certificate_number": cert_number,
+        "certificate_type": certificate.get('certificate_type'),
+        "name": mask_name(certificate.get('recipient_name')),
+        "issued_on": str(certificate.get('issue_date', ''))[:10]
+    }
+
+async def cached_verification(kind: str, number: str, lookup):
+    hit, result = verification_cache.get((kind, number))
+    VERIFY_CACHE_LOOKUPS.inc((kind, "hit" if hit else "miss"))
+    if not hit:
+        result = await lookup(number)
+        verification_cache.set((kind, number), result, VERIFY_POSITIVE_TTL if result else VERIFY_NEGATIVE_TTL)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{kind.title()} not found",
+                            headers={"Cache-Control": f"public, max-age={VERIFY_NEGATIVE_TTL}"})
+    return JSONResponse(result, headers={"Cache-Control": f"public, max-age={VERIFY_POSITIVE_TTL}"})
+
+def invalidate_verification(collection: str):
+    # Deletes are rare, so dropping the whole cache is simpler than tracking numbers
+    if collection in ("donations", "receipts", "certificates"):
+        verification_cache.clear()
+
+@api_router.get("/verify-receipt/{receipt_number}")
+async def verify_receipt(receipt_number: str):
+    """Public endpoint behind receipt QR codes"""
+    return await cached_verification("receipt", receipt_number, lookup_receipt)
+
+@api_router.get("/verify-certificate/{cert_number}")
+async def verify_certificate(cert_number: str):
+    """Public endpoint behind certificate QR codes"""
+    return await cached_verification("certificate", cert_number, lookup_certificate)
+
 # ==================== STATS ROUTES ====================
 
-@api_router.get("/stats")
-async def get_stats():
-    total_members = await db.members.count_documents({"status": "approved"})
-    total_donations = await db.donations.count_documents({"status": "completed"})
-    
-    # Calculate total donation amount
-    donations = await db.donations.find({"status": "completed"}, {"_id": 0, "amount": 1}).to_list(10000)
-    total_amount = sum(d['amount'] for d in donations)
-    
-    total_beneficiaries = await db.beneficiaries.count_documents({})
-    total_campaigns = await db.campaigns.count_documents({"status": "active"})
+async def compute_stats() -> dict:
+    # Independent queries, so run them concurrently; the amount is summed in Mongo
+    total_members, total_donations, amount, total_beneficiaries, total_campaigns = await asyncio.gather(
+        db.members.count_documents({"status": "approved", "deleted_at": None}),
+        db.donations.count_documents({"status": "completed", "deleted_at": None}),
+        db.donations.aggregate([
+            {"$match": {"status": "completed", "deleted_at": None}},
+            {"$group": {"_id": None, **paise_total("amount")}}
+        ]).to_list(1),
+        db.beneficiaries.count_documents({"deleted_at": None}),
+        db.campaigns.count_documents({"status": "active", "deleted_at": None})
+    )
+    total_amount = rupees(amount[0] if amount else None)
     
     return {
         "total_members": total_members,
@@ -1010,7 +3176,135 @@ async def get_stats():
         "total_campaigns": total_campaigns
     }
 
+@api_router.get("/stats")
+async def get_stats():
+    return await compute_stats()
+
+# ==================== COMPOSITE ROUTES ====================
+
+HOME_SECTION_LIMIT = int(os.environ.get('HOME_SECTION_LIMIT', '6'))
+NEWS_EXCERPT_CHARS = 240
+DASHBOARD_TTL = int(os.environ.get('DASHBOARD_TTL', '15'))
+HOME_PAYLOAD_TTL = 30
+home_cache = LRUCache(maxsize=64)
+dashboard_cache = LRUCache(maxsize=2048)
+
+async def load_sections(cache: LRUCache, sections: dict, key: tuple = ()) -> dict:
+    """Load {name: (loader, ttl)} concurrently, serving each section from the cache while it's fresh"""
+    result, missing = {}, []
+    for name, (loader, ttl) in sections.items():
+        hit, value = cache.get(key + (name,))
+        if hit:
+            result[name] = value
+        else:
+            missing.append((name, loader, ttl))
+    values = await asyncio.gather(*[loader() for _, loader, _ in missing])
+    for (name, _, ttl), value in zip(missing, values):
+        cache.set(key + (name,), value, ttl)
+        result[name] = value
+    return {name: result[name] for name in sections}
+
+def invalidate_home(collection: str):
+    """Drop homepage sections in this worker after a write; other workers wait out the TTL"""
+    if collection in HOME_SECTIONS:
+        # Rendered payloads embed every section, so they all go too
+        home_cache.clear()
+
+async def home_news() -> list:
+    news_list = await db.news.find(
+        {"published": True, "deleted_at": None},
+        {"_id": 0, "id": 1, "title": 1, "content": 1, "image_url": 1, "created_at": 1}
+    ).sort("created_at", -1).to_list(HOME_SECTION_LIMIT)
+    for item in news_list:
+        item['content'] = item.get('content', '')[:NEWS_EXCERPT_CHARS]
+    return news_list
+
+async def home_campaigns() -> list:
+    return await db.campaigns.find(
+        {"status": "active", "deleted_at": None}, {"_id": 0, **SUMMARY_PROJECTIONS[Campaign]}
+    ).to_list(HOME_SECTION_LIMIT)
+
+async def home_events() -> list:
+    return await db.events.find(
+        {"deleted_at": None, **date_match("event_date", "$gte", datetime.now(timezone.utc))},
+        {"_id": 0, **SUMMARY_PROJECTIONS[Event]}
+    ).sort("event_date", 1).to_list(HOME_SECTION_LIMIT)
+
+async def home_activities() -> list:
+    return await db.activities.find(
+        {"deleted_at": None}, {"_id": 0, **SUMMARY_PROJECTIONS[Activity]}
+    ).sort("created_at", -1).to_list(HOME_SECTION_LIMIT)
+
+# section -> (loader, seconds to cache)
+HOME_SECTIONS = {
+    "stats": (compute_stats, 60),
+    "news": (home_news, 120),
+    "campaigns": (home_campaigns, 120),
+    "events": (home_events, 300),
+    "activities": (home_activities, 300),
+}
+
+@api_router.get("/home")
+async def get_home(request: Request, sections: Optional[str] = None):
+    """Everything the landing page needs in one round trip; `sections` is a comma-separated subset"""
+    wanted = sections.split(",") if sections else list(HOME_SECTIONS)
+    unknown = [name for name in wanted if name not in HOME_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+    # The rendered body and its compressed variants are cached, so a hit costs no JSON or compression work
+    hit, encoded = home_cache.get(("payload",) + tuple(wanted))
+    if not hit:
+        payload = await load_sections(home_cache, {name: HOME_SECTIONS[name] for name in wanted})
+        encoded = EncodedBody(payload)
+        home_cache.set(("payload",) + tuple(wanted), encoded, HOME_PAYLOAD_TTL)
+    return encoded.response(request, {"Cache-Control": f"public, max-age={HOME_PAYLOAD_TTL}"})
+
+@api_router.get("/me/dashboard")
+async def get_my_dashboard(user_data: dict = Depends(verify_token)):
+    """Profile, memberships, recent donations and certificates for the signed-in user"""
+    user_id, email = user_data['user_id'], user_data['email']
+
+    async def profile():
+        return await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+
+    async def memberships():
+        return await db.members.find(
+            {"user_id": user_id, "deleted_at": None},
+            {"_id": 0, "id": 1, "member_number": 1, "designation": 1, "city": 1, "status": 1, "joined_at": 1}
+        ).to_list(10)
+
+    async def donations():
+        recent, profile = await asyncio.gather(
+            db.donations.find(
+                {"donor_email": email, "deleted_at": None},
+                {"_id": 0, "id": 1, "amount": 1, "status": 1, "receipt_number": 1, "campaign_id": 1, "created_at": 1}
+            ).sort("created_at", -1).to_list(10),
+            db.donor_profiles.find_one({"key": donor_key(email, None)}, {"_id": 0, "lifetime_paise": 1, "donation_count": 1})
+        )
+        return {
+            "recent": recent,
+            "total_amount": profile['lifetime_paise'] / 100 if profile else 0,
+            "completed_count": profile['donation_count'] if profile else 0
+        }
+
+    async def certificates():
+        return await db.certificates.find(
+            {"recipient_email": email, "deleted_at": None},
+            {"_id": 0, "id": 1, "certificate_number": 1, "certificate_type": 1, "issue_date": 1}
+        ).to_list(20)
+
+    payload = await load_sections(dashboard_cache, {
+        "profile": (profile, DASHBOARD_TTL),
+        "memberships": (memberships, DASHBOARD_TTL),
+        "donations": (donations, DASHBOARD_TTL),
+        "certificates": (certificates, DASHBOARD_TTL),
+    }, key=(user_id,))
+    if payload['profile'] is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return payload
+
 # ==================== RECEIPT ROUTES ====================
+
 @api_router.patch("/users/{user_id}/approve")
 async def approve_user(user_id: str, admin: dict = Depends(verify_token)):
     if admin.get('role') != 'admin':
@@ -1021,14 +3315,11 @@ async def approve_user(user_id: str, admin: dict = Depends(verify_token)):
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    publish_change("users", "update", {"id": user_id, "role": "member", "is_active": True})
 
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     try:
-        html = f"""
-        <h2>Membership Approved</h2>
-        <p>Dear {user.get('name')},</p>
-        <p>Your membership has been <strong>approved</strong>. Congratulations — you can now access the member dashboard.</p>
-        """
+        html = render_email("membership_approved.html", name=user.get('name'))
         await send_email(user['email'], "Membership Approved - NVP Welfare Foundation", html)
     except Exception as e:
         logger.warning("Failed to send approval email: %s", e)
@@ -1046,58 +3337,794 @@ async def reject_user(user_id: str, admin: dict = Depends(verify_token)):
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    publish_change("users", "update", {"id": user_id, "is_active": False, "role": "public"})
 
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     try:
-        html = f"""
-        <h2>Membership Request Update</h2>
-        <p>Dear {user.get('name')},</p>
-        <p>We are sorry to inform you that your membership request has been <strong>rejected</strong>. For more details, please contact the admin.</p>
-        """
+        html = render_email("membership_rejected.html", name=user.get('name'))
         await send_email(user['email'], "Membership Rejected - NVP Welfare Foundation", html)
     except Exception as e:
         logger.warning("Failed to send rejection email: %s", e)
 
     return {"message": "User rejected and notified"}
 
+# ==================== DATA LIFECYCLE ====================
+
+# Collections whose delete routes only mark documents; purged by TTL after the retention period
+SOFT_DELETE_COLLECTIONS = {
+    "members", "donations", "certificates", "news", "activities", "campaigns",
+    "beneficiaries", "events", "projects", "internships", "designations", "receipts"
+}
+SOFT_DELETE_RETENTION_DAYS = int(os.environ.get('SOFT_DELETE_RETENTION_DAYS', '30'))
+ENQUIRY_ARCHIVE_DAYS = int(os.environ.get('ENQUIRY_ARCHIVE_DAYS', '90'))
+STALE_ORDER_HOURS = int(os.environ.get('STALE_ORDER_HOURS', '48'))
+ARCHIVED_ORDER_RETENTION_DAYS = int(os.environ.get('ARCHIVED_ORDER_RETENTION_DAYS', '30'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+
+def soft_delete_fields() -> dict:
+    now = datetime.now(timezone.utc)
+    # purge_at is a BSON date so the TTL monitor can act on it
+    return {"deleted_at": now, "purge_at": now + timedelta(days=SOFT_DELETE_RETENTION_DAYS)}
+
+async def soft_delete(collection: str, item_id: str) -> bool:
+    """Mark a document deleted; returns False if it doesn't exist or is already deleted"""
+    result = await db[collection].update_one({"id": item_id, "deleted_at": None}, {"$set": soft_delete_fields()})
+    invalidate_verification(collection)
+    invalidate_home(collection)
+    return result.matched_count > 0
+
+def archive_rules(now: datetime) -> List[tuple]:
+    """(collection, cold-document query, days to keep in the archive or None to keep forever)"""
+    return [
+        ("enquiries", {
+            "status": "replied",
+            **date_match("created_at", "$lt", now - timedelta(days=ENQUIRY_ARCHIVE_DAYS))
+        }, None),
+        ("donations", {
+            "status": {"$in": ["pending", "expired"]},
+            **date_match("created_at", "$lt", now - timedelta(hours=STALE_ORDER_HOURS))
+        }, ARCHIVED_ORDER_RETENTION_DAYS),
+    ]
+
+async def archive_collection(collection: str, query: dict, retention_days: Optional[int]) -> int:
+    """Move matching documents into `<collection>_archive` in batches"""
+    moved = 0
+    while True:
+        docs = await db[collection].find(query).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not docs:
+            break
+        now = datetime.now(timezone.utc)
+        for doc in docs:
+            doc['archived_at'] = now
+            if retention_days:
+                doc['purge_at'] = now + timedelta(days=retention_days)
+        # Upsert by _id so a batch interrupted between copy and delete is safe to replay
+        await db[f"{collection}_archive"].bulk_write(
+            [ReplaceOne({"_id": doc['_id']}, doc, upsert=True) for doc in docs], ordered=False
+        )
+        await db[collection].delete_many({"_id": {"$in": [doc['_id'] for doc in docs]}})
+        moved += len(docs)
+        if len(docs) < ARCHIVE_BATCH_SIZE:
+            break
+        # Yield between batches so archiving doesn't monopolise the pool
+        await asyncio.sleep(0.1)
+    return moved
+
+async def run_archiver() -> dict:
+    moved = {}
+    for collection, query, retention_days in archive_rules(datetime.now(timezone.utc)):
+        moved[collection] = await archive_collection(collection, query, retention_days)
+        if moved[collection]:
+            logger.info("Archived %d documents from %s", moved[collection], collection)
+    return moved
+
+@api_router.post("/admin/archive/run")
+async def run_archiver_now(user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    return {"message": "Archive run complete", "archived": await run_archiver()}
+
+@api_router.get("/trash/{resource}")
+async def get_trash(resource: str, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    if resource not in SOFT_DELETE_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Unknown resource")
+    items = await db[resource].find(
+        {"deleted_at": {"$exists": True}}, {"_id": 0, "purge_at": 0}
+    ).sort("deleted_at", -1).to_list(1000)
+    return items
+
+@api_router.post("/trash/{resource}/{item_id}/restore")
+async def restore_from_trash(resource: str, item_id: str, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    if resource not in SOFT_DELETE_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Unknown resource")
+    result = await db[resource].update_one(
+        {"id": item_id, "deleted_at": {"$exists": True}},
+        {"$unset": {"deleted_at": "", "purge_at": ""}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Item not found in trash")
+    invalidate_verification(resource)
+    invalidate_home(resource)
+    return {"message": "Item restored"}
+
+# ==================== SCHEMA MIGRATIONS ====================
+
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', '500'))
+# Pause between batches so a running migration leaves room for live traffic
+MIGRATION_PAUSE_SECONDS = float(os.environ.get('MIGRATION_PAUSE_SECONDS', '0.1'))
+MIGRATION_LEASE_SECONDS = int(os.environ.get('MIGRATION_LEASE_SECONDS', '120'))
+
+# version -> (name, fields rewritten per collection, storage_changes() options)
+MIGRATIONS = {
+    1: ("dates_to_bson", DATE_FIELDS, {"money": False}),
+    2: ("money_to_paise", MONEY_FIELDS, {"dates": False}),
+}
+migration_tasks = set()
+
+def migration_lease() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=MIGRATION_LEASE_SECONDS)
+
+async def claim_migration(version: int, owner: str) -> bool:
+    """Take the lease on a migration unless it is complete or another process holds it"""
+    now = datetime.now(timezone.utc)
+    await db.schema_migrations.update_one(
+        {"version": version},
+        {"$setOnInsert": {
+            "version": version, "name": MIGRATIONS[version][0], "status": "pending",
+            "progress": {}, "scanned": 0, "modified": 0, "lease_until": None
+        }},
+        upsert=True
+    )
+    result = await db.schema_migrations.update_one(
+        {
+            "version": version,
+            "status": {"$ne": "completed"},
+            "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]
+        },
+        {
+            "$set": {"status": "running", "owner": owner, "lease_until": migration_lease(), "error": None},
+            "$min": {"started_at": now}
+        }
+    )
+    return result.modified_count == 1
+
+async def migrate_collection(version: int, collection: str, owner: str, run: dict):
+    """Rewrite one collection in _id order, resuming after the last batch that was recorded"""
+    _, registry, options = MIGRATIONS[version]
+    record = await db.schema_migrations.find_one({"version": version}, {"_id": 0, "progress": 1})
+    progress = record['progress'].get(collection, {})
+    if progress.get('done'):
+        return
+    fields = registry[collection]
+    projection = {name: 1 for field in fields for name in (field, f"{field}_paise")}
+    last_id = progress.get('last_id')
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await db[collection].find(query, projection).sort("_id", 1).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not batch:
+            break
+        updates = []
+        for doc in batch:
+            changes = storage_changes(collection, doc, **options)
+            if changes:
+                # Only rewrite values that haven't changed since this batch read them
+                unchanged = {field: doc.get(field) for field in fields}
+                updates.append(UpdateOne({"_id": doc['_id'], **unchanged}, {"$set": changes}))
+        modified = 0
+        if updates:
+            modified = (await db[collection].bulk_write(updates, ordered=False)).modified_count
+        last_id = batch[-1]['_id']
+
+        run['scanned'] += len(batch)
+        elapsed = time.monotonic() - run['started']
+        saved = await db.schema_migrations.update_one(
+            {"version": version, "owner": owner},
+            {
+                "$set": {
+                    f"progress.{collection}.last_id": last_id,
+                    "lease_until": migration_lease(),
+                    "docs_per_second": round(run['scanned'] / elapsed, 1) if elapsed else None,
+                    "updated_at": datetime.now(timezone.utc)
+                },
+                "$inc": {
+                    f"progress.{collection}.scanned": len(batch),
+                    f"progress.{collection}.modified": modified,
+                    "scanned": len(batch),
+                    "modified": modified
+                }
+            }
+        )
+        if saved.matched_count == 0:
+            raise RuntimeError(f"Lost the lease on migration {version}")
+        await asyncio.sleep(MIGRATION_PAUSE_SECONDS)
+
+    await db.schema_migrations.update_one(
+        {"version": version, "owner": owner}, {"$set": {f"progress.{collection}.done": True}}
+    )
 
+async def run_migration(version: int) -> bool:
+    """Run a migration to completion; False if it is already complete or running elsewhere"""
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    if not await claim_migration(version, owner):
+        return False
+    name, registry, _ = MIGRATIONS[version]
+    run = {"started": time.monotonic(), "scanned": 0}
+    logger.info("Migration %d (%s) started", version, name)
+    try:
+        for collection in registry:
+            await migrate_collection(version, collection, owner, run)
+    except Exception as e:
+        logger.error("Migration %d (%s) failed: %s", version, name, e)
+        await db.schema_migrations.update_one(
+            {"version": version, "owner": owner},
+            {"$set": {"status": "failed", "error": str(e), "lease_until": None}}
+        )
+        raise
+    await db.schema_migrations.update_one(
+        {"version": version, "owner": owner},
+        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc), "lease_until": None}}
+    )
+    logger.info("Migration %d (%s) completed: %d documents scanned", version, name, run['scanned'])
+    return True
+
+async def migration_status() -> List[dict]:
+    records = await db.schema_migrations.find({}, {"_id": 0, "owner": 0}).to_list(len(MIGRATIONS) + 10)
+    records = {r['version']: r for r in records}
+    status = []
+    for version, (name, registry, _) in sorted(MIGRATIONS.items()):
+        record = records.get(version, {"version": version, "name": name, "status": "pending", "progress": {}, "scanned": 0, "modified": 0})
+        totals = await asyncio.gather(*(db[c].estimated_document_count() for c in registry))
+        record['total'] = sum(totals)
+        record['percent'] = round(100 * min(record['scanned'], record['total']) / record['total'], 1) if record['total'] else 100.0
+        if record['status'] == "completed":
+            record['percent'] = 100.0
+        for collection, entry in record['progress'].items():
+            entry.pop('last_id', None)
+        status.append(record)
+    return status
+
+@api_router.get("/admin/migrations")
+async def list_migrations(user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    return await migration_status()
+
+@api_router.post("/admin/migrations/{version}/run")
+async def start_migration(version: int, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    if version not in MIGRATIONS:
+        raise HTTPException(status_code=404, detail="Unknown migration")
+    record = await db.schema_migrations.find_one({"version": version}, {"_id": 0, "status": 1, "lease_until": 1})
+    if record and record['status'] == "completed":
+        return {"message": "Migration already completed", "version": version}
+    if record and record.get('lease_until') and parse_stored_date(record['lease_until']) > datetime.now(timezone.utc):
+        raise HTTPException(status_code=409, detail="Migration is already running")
+
+    task = asyncio.create_task(run_migration(version))
+    migration_tasks.add(task)
+    task.add_done_callback(migration_tasks.discard)
+    return {"message": "Migration started", "version": version}
+
+async def migrate_all():
+    """`python server.py migrate`: run every pending migration in order"""
+    global client, db
+    client = create_mongo_client()
+    db = client[DB_NAME]
+    await ensure_indexes()
+    for version in sorted(MIGRATIONS):
+        if not await run_migration(version):
+            logger.info("Migration %d skipped: already completed or running elsewhere", version)
+    client.close()
+
+# ==================== BULK ADMIN ROUTES ====================
+
+class BulkRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=1000)
+    status: Optional[str] = None
+
+# Collections that have a single-item delete route and may be bulk deleted
+BULK_DELETE_COLLECTIONS = SOFT_DELETE_COLLECTIONS
+
+def bulk_results(ids: List[str], found: set, outcome: str) -> dict:
+    results = [{"id": item_id, "status": outcome if item_id in found else "not_found"} for item_id in ids]
+    return {"matched": len(found), "requested": len(ids), "results": results}
+
+async def set_users_membership(ids: List[str], update: dict, subject: str, template_name: str) -> set:
+    """Apply one update_many to the given users and queue one notification per user"""
+    users = await db.users.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1, "email": 1}).to_list(len(ids))
+    if users:
+        await db.users.update_many({"id": {"$in": [u['id'] for u in users]}}, {"$set": update})
+        for user in users:
+            publish_change("users", "update", {**user, **update})
+        bodies = render_email_batch(template_name, ({"name": u.get('name')} for u in users))
+        enqueue_emails([(u['email'], subject, html) for u, html in zip(users, bodies)])
+    return {u['id'] for u in users}
+
+@api_router.post("/bulk/users/approve")
+async def bulk_approve_users(request: BulkRequest, admin: dict = Depends(verify_token)):
+    if admin.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    found = await set_users_membership(
+        request.ids, {"role": "member", "is_active": True},
+        "Membership Approved - NVP Welfare Foundation", "membership_approved.html"
+    )
+    return bulk_results(request.ids, found, "approved")
+
+@api_router.post("/bulk/users/reject")
+async def bulk_reject_users(request: BulkRequest, admin: dict = Depends(verify_token)):
+    if admin.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    found = await set_users_membership(
+        request.ids, {"is_active": False, "role": "public"},
+        "Membership Rejected - NVP Welfare Foundation", "membership_rejected.html"
+    )
+    return bulk_results(request.ids, found, "rejected")
+
+@api_router.post("/bulk/members/status")
+async def bulk_update_member_status(request: BulkRequest, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can update status")
+    if request.status not in ("pending", "approved", "blocked"):
+        raise HTTPException(status_code=400, detail="Status must be pending, approved or blocked")
+
+    members = await db.members.find({"id": {"$in": request.ids}, "deleted_at": None}, {"_id": 0, "id": 1}).to_list(len(request.ids))
+    found = {m['id'] for m in members}
+    if found:
+        await db.members.update_many({"id": {"$in": list(found)}}, {"$set": {"status": request.status}})
+        for member_id in found:
+            publish_change("members", "update", {"id": member_id, "status": request.status})
+    return bulk_results(request.ids, found, "updated")
+
+@api_router.post("/bulk/enquiries/status")
+async def bulk_update_enquiry_status(request: BulkRequest, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can update status")
+    if request.status not in ENQUIRY_STATUSES:
+        raise HTTPException(status_code=400, detail="Status must be pending or replied")
+
+    enquiries = await db.enquiries.find({"id": {"$in": request.ids}}, {"_id": 0, "id": 1}).to_list(len(request.ids))
+    found = {e['id'] for e in enquiries}
+    if found:
+        await db.enquiries.update_many({"id": {"$in": list(found)}}, {"$set": {"status": request.status}})
+        for enquiry_id in found:
+            publish_change("enquiries", "update", {"id": enquiry_id, "status": request.status})
+    return bulk_results(request.ids, found, "updated")
+
+@api_router.post("/bulk/{resource}/delete")
+async def bulk_delete(resource: str, request: BulkRequest, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail=f"Only admins can delete {resource}")
+    if resource not in BULK_DELETE_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Unknown resource")
+
+    collection = db[resource]
+    docs = await collection.find({"id": {"$in": request.ids}, "deleted_at": None}, {"_id": 0, "id": 1}).to_list(len(request.ids))
+    found = {d['id'] for d in docs}
+    if found:
+        await collection.update_many({"id": {"$in": list(found)}}, {"$set": soft_delete_fields()})
+        invalidate_verification(resource)
+        invalidate_home(resource)
+        for item_id in found:
+            publish_change(resource, "delete", {"id": item_id})
+    return bulk_results(request.ids, found, "deleted")
+
+# ==================== BROADCAST ROUTES ====================
+
+BROADCAST_CHUNK_SIZE = int(os.environ.get('BROADCAST_CHUNK_SIZE', '200'))
+BROADCAST_RATE_PER_SECOND = float(os.environ.get('BROADCAST_RATE_PER_SECOND', '10'))  # per worker
+BROADCAST_POLL_SECONDS = int(os.environ.get('BROADCAST_POLL_SECONDS', '5'))
+BROADCAST_CLAIM_TIMEOUT_SECONDS = int(os.environ.get('BROADCAST_CLAIM_TIMEOUT_SECONDS', '600'))
+BROADCAST_MAX_ATTEMPTS = int(os.environ.get('BROADCAST_MAX_ATTEMPTS', '3'))
+# A failed delivery waits this long before its second attempt, doubling for each one after
+BROADCAST_RETRY_SECONDS = int(os.environ.get('BROADCAST_RETRY_SECONDS', '60'))
+broadcast_wakeup = asyncio.Event()
+
+class BroadcastAudience(BaseModel):
+    type: Literal["members", "donors"]
+    status: str = "approved"  # members only
+    city: Optional[str] = None  # members only
+    campaign_id: Optional[str] = None  # donors only; all completed donations when omitted
+
+class BroadcastCreate(BaseModel):
+    subject: str = Field(min_length=1, max_length=200)
+    message: str = Field(min_length=1)
+    link_url: Optional[str] = None
+    audience: BroadcastAudience
+
+class RatePacer:
+    """Spaces calls out to at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_at = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self.next_at)
+        self.next_at = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+broadcast_pacer = RatePacer(BROADCAST_RATE_PER_SECOND)
+
+def audience_pipeline(audience: dict) -> tuple:
+    """(collection, pipeline) yielding one {email, name} document per recipient"""
+    if audience['type'] == "members":
+        query = {"status": audience.get('status') or "approved", "deleted_at": None}
+        if audience.get('city'):
+            query['city'] = audience['city']
+        return "members", [
+            {"$match": query},
+            {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+            {"$unwind": "$user"},
+            {"$match": {"user.email": {"$ne": None}, "user.deleted_at": None}},
+            {"$project": {"_id": 0, "email": "$user.email", "name": "$user.name"}}
+        ]
+    query = {"status": "completed", "deleted_at": None}
+    if audience.get('campaign_id'):
+        query['campaign_id'] = audience['campaign_id']
+    return "donations", [
+        {"$match": query},
+        {"$group": {"_id": "$donor_email", "name": {"$first": "$donor_name"}}},
+        {"$project": {"_id": 0, "email": "$_id", "name": 1}}
+    ]
+
+def stale_claim_time() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=BROADCAST_CLAIM_TIMEOUT_SECONDS)
+
+async def claim_broadcast() -> Optional[dict]:
+    """Take one queued broadcast (or one whose builder died) for audience building"""
+    return await db.broadcasts.find_one_and_update(
+        {"$or": [{"status": "queued"}, {"status": "building", **date_match("claimed_at", "$lt", stale_claim_time())}]},
+        {"$set": {"status": "building", "claimed_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0},
+        sort=[("created_at", 1)]
+    )
+
+async def write_deliveries(broadcast_id: str, recipients: List[dict]):
+    # Upserts keyed on (broadcast_id, email) dedupe recipients and make a rebuild after a crash harmless
+    await db.broadcast_deliveries.bulk_write([
+        UpdateOne(
+            {"broadcast_id": broadcast_id, "email": r['email']},
+            {"$setOnInsert": {"id": str(uuid.uuid4()), "name": r.get('name'), "status": "pending", "attempts": 0}},
+            upsert=True
+        )
+        for r in recipients
+    ], ordered=False)
+
+async def build_audience(broadcast: dict):
+    """Stream the audience from a cursor into delivery records, one chunk at a time"""
+    collection, pipeline = audience_pipeline(broadcast['audience'])
+    chunk = []
+    async for recipient in db[collection].aggregate(pipeline, allowDiskUse=True, batchSize=BROADCAST_CHUNK_SIZE):
+        chunk.append(recipient)
+        if len(chunk) >= BROADCAST_CHUNK_SIZE:
+            await write_deliveries(broadcast['id'], chunk)
+            chunk = []
+    if chunk:
+        await write_deliveries(broadcast['id'], chunk)
+    total = await db.broadcast_deliveries.count_documents({"broadcast_id": broadcast['id']})
+    await db.broadcasts.update_one(
+        {"id": broadcast['id'], "status": "building"},
+        {"$set": {"status": "sending", "total": total}}
+    )
+    logger.info("Broadcast %s: %d recipients", broadcast['id'], total)
+
+async def claim_deliveries(broadcast_id: str) -> List[dict]:
+    """Claim the next chunk of pending deliveries so several workers can share a broadcast"""
+    claimable = {
+        "broadcast_id": broadcast_id,
+        "$or": [
+            {"status": "pending", "retry_at": None},
+            {"status": "pending", **date_match("retry_at", "$lte", datetime.now(timezone.utc))},
+            {"status": "sending", **date_match("claimed_at", "$lt", stale_claim_time())}
+        ]
+    }
+    candidates = await db.broadcast_deliveries.find(claimable, {"_id": 0, "id": 1}).limit(BROADCAST_CHUNK_SIZE).to_list(BROADCAST_CHUNK_SIZE)
+    if not candidates:
+        return []
+    claim = uuid.uuid4().hex
+    await db.broadcast_deliveries.update_many(
+        {**claimable, "id": {"$in": [c['id'] for c in candidates]}},
+        {"$set": {"status": "sending", "claim": claim, "claimed_at": datetime.now(timezone.utc)}}
+    )
+    return await db.broadcast_deliveries.find(
+        {"broadcast_id": broadcast_id, "status": "sending", "claim": claim}, {"_id": 0}
+    ).to_list(BROADCAST_CHUNK_SIZE)
+
+async def paced_delivery(to: str, subject: str, html_content: str):
+    await broadcast_pacer.wait()
+    await deliver_email(to, subject, html_content)
+
+async def send_delivery_chunk(broadcast: dict, deliveries: List[dict]):
+    bodies = render_email_batch("broadcast.html", (
+        {"name": d.get('name'), "subject": broadcast['subject'], "message": broadcast['message'], "link_url": broadcast.get('link_url')}
+        for d in deliveries
+    ))
+    results = await asyncio.gather(*[
+        paced_delivery(d['email'], broadcast['subject'], html) for d, html in zip(deliveries, bodies)
+    ], return_exceptions=True)
+
+    now = datetime.now(timezone.utc)
+    updates, sent, failed = [], 0, 0
+    for delivery, result in zip(deliveries, results):
+        if isinstance(result, BaseException):
+            attempts = delivery.get('attempts', 0) + 1
+            final = attempts >= BROADCAST_MAX_ATTEMPTS
+            if final:
+                failed += 1
+            retry_at = None if final else now + timedelta(seconds=BROADCAST_RETRY_SECONDS * 2 ** (attempts - 1))
+            updates.append(UpdateOne({"id": delivery['id']}, {"$set": {
+                "status": "failed" if final else "pending", "attempts": attempts, "retry_at": retry_at,
+                "error": str(result) or type(result).__name__
+            }}))
+        else:
+            sent += 1
+            updates.append(UpdateOne({"id": delivery['id']}, {"$set": {"status": "sent", "sent_at": now}, "$inc": {"attempts": 1}}))
+    await db.broadcast_deliveries.bulk_write(updates, ordered=False)
+    progress = await db.broadcasts.find_one_and_update(
+        {"id": broadcast['id']}, {"$inc": {"sent": sent, "failed": failed}},
+        projection={"_id": 0, "id": 1, "subject": 1, "status": 1, "total": 1, "sent": 1, "failed": 1}
+    )
+    progress['sent'] += sent
+    progress['failed'] += failed
+    publish_change("broadcasts", "update", progress)
+
+async def send_broadcast(broadcast: dict):
+    while True:
+        # Re-check between chunks so a cancel takes effect promptly
+        current = await db.broadcasts.find_one({"id": broadcast['id']}, {"_id": 0, "status": 1})
+        if not current or current['status'] != "sending":
+            return
+        deliveries = await claim_deliveries(broadcast['id'])
+        if not deliveries:
+            break
+        await send_delivery_chunk(broadcast, deliveries)
+
+    # Another worker may still be sending its last chunk
+    unfinished = await db.broadcast_deliveries.find_one(
+        {"broadcast_id": broadcast['id'], "status": {"$in": ["pending", "sending"]}}, {"_id": 1}
+    )
+    if not unfinished:
+        await db.broadcasts.update_one(
+            {"id": broadcast['id'], "status": "sending"},
+            {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc)}}
+        )
+
+async def run_broadcasts():
+    while (broadcast := await claim_broadcast()) is not None:
+        await build_audience(broadcast)
+    for broadcast in await db.broadcasts.find({"status": "sending"}, {"_id": 0}).sort("created_at", 1).to_list(100):
+        await send_broadcast(broadcast)
+
+async def broadcast_loop():
+    while True:
+        broadcast_wakeup.clear()
+        try:
+            await run_broadcasts()
+        except Exception as e:
+            logger.error("Broadcast run failed: %s", e)
+        try:
+            await asyncio.wait_for(broadcast_wakeup.wait(), BROADCAST_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+async def queue_broadcast(request: BroadcastCreate, created_by: str) -> str:
+    broadcast = {
+        "id": str(uuid.uuid4()),
+        **request.model_dump(),
+        "status": "queued",
+        "total": 0,
+        "sent": 0,
+        "failed": 0,
+        "created_by": created_by,
+        "created_at": datetime.now(timezone.utc),
+        "claimed_at": None,
+        "completed_at": None
+    }
+    await db.broadcasts.insert_one(broadcast)
+    broadcast_wakeup.set()
+    return broadcast['id']
+
+@api_router.post("/admin/broadcasts")
+async def create_broadcast(request: BroadcastCreate, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    broadcast_id = await queue_broadcast(request, user_data['user_id'])
+    return {"message": "Broadcast queued", "id": broadcast_id}
+
+@api_router.get("/admin/broadcasts")
+async def list_broadcasts(user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    return await db.broadcasts.find({}, {"_id": 0, "message": 0}).sort("created_at", -1).to_list(100)
+
+@api_router.get("/admin/broadcasts/{broadcast_id}")
+async def get_broadcast(broadcast_id: str, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    broadcast = await db.broadcasts.find_one({"id": broadcast_id}, {"_id": 0})
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    counts = await db.broadcast_deliveries.aggregate([
+        {"$match": {"broadcast_id": broadcast_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]).to_list(10)
+    broadcast['deliveries'] = {c['_id']: c['count'] for c in counts}
+    done = broadcast['sent'] + broadcast['failed']
+    broadcast['progress'] = round(done / broadcast['total'], 4) if broadcast['total'] else 0.0
+    return broadcast
+
+@api_router.get("/admin/broadcasts/{broadcast_id}/deliveries")
+async def get_broadcast_deliveries(
+    broadcast_id: str,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    user_data: dict = Depends(verify_token)
+):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    query = {"broadcast_id": broadcast_id}
+    if status:
+        query['status'] = status
+    limit = max(1, min(limit, 500))
+    items = await db.broadcast_deliveries.find(
+        query, {"_id": 0, "claim": 0}
+    ).skip(max(skip, 0)).limit(limit).to_list(limit)
+    return {"skip": skip, "limit": limit, "items": items}
+
+@api_router.post("/admin/broadcasts/{broadcast_id}/cancel")
+async def cancel_broadcast(broadcast_id: str, user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    result = await db.broadcasts.update_one(
+        {"id": broadcast_id, "status": {"$in": ["queued", "building", "sending"]}},
+        {"$set": {"status": "cancelled", "completed_at": datetime.now(timezone.utc)}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="No active broadcast with this id")
+    await db.broadcast_deliveries.update_many(
+        {"broadcast_id": broadcast_id, "status": "pending"}, {"$set": {"status": "cancelled"}}
+    )
+    return {"message": "Broadcast cancelled"}
 
 # ==================== IMAGE UPLOAD ROUTES ====================
 
-# Create uploads directory
+# Uploads directory for the local backend (created on first use)
 UPLOAD_DIR = ROOT_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')  # local, s3
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None  # e.g. a MinIO server
+S3_REGION = os.environ.get('S3_REGION') or None
+S3_PUBLIC_BASE_URL = os.environ.get('S3_PUBLIC_BASE_URL', '').rstrip('/')  # CDN / public bucket URL
+S3_PRESIGN_EXPIRY = int(os.environ.get('S3_PRESIGN_EXPIRY', '3600'))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+IMAGE_EXTENSIONS = {"image/jpeg": "jpeg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+UPLOAD_NAME_PATTERN = re.compile(r"^[0-9a-f]{32}\.[A-Za-z0-9]{1,5}$")
+
+class LocalStorage:
+    """Files on this machine's disk, served by the API"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(exist_ok=True)
+
+    def _copy(self, key: str, source):
+        with open(self.root / key, "wb") as out:
+            shutil.copyfileobj(source, out, 1024 * 1024)
+
+    async def save_stream(self, key: str, source, content_type: str):
+        await asyncio.to_thread(self._copy, key, source)
+
+    async def save_bytes(self, key: str, data: bytes, content_type: str):
+        await asyncio.to_thread((self.root / key).write_bytes, data)
+
+    def presign_upload(self, key: str, content_type: str) -> Optional[dict]:
+        return None  # clients fall back to POST /api/upload-image
+
+    async def serve(self, key: str):
+        path = self.root / key
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="File not found")
+        return FileResponse(path)
+
+class S3Storage:
+    """S3-compatible bucket; the API hands out presigned URLs instead of proxying bytes"""
+
+    def __init__(self, bucket: str):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        self.bucket = bucket
+        self.s3 = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION)
+        # Files above 8 MB go up as parallel multipart parts
+        self.transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024)
+
+    async def save_stream(self, key: str, source, content_type: str):
+        with outbound_timer("s3", "upload"):
+            await asyncio.to_thread(
+                self.s3.upload_fileobj, source, self.bucket, key,
+                ExtraArgs={"ContentType": content_type}, Config=self.transfer_config
+            )
+
+    async def save_bytes(self, key: str, data: bytes, content_type: str):
+        with outbound_timer("s3", "put_object"):
+            await asyncio.to_thread(self.s3.put_object, Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+    def presign_upload(self, key: str, content_type: str) -> Optional[dict]:
+        return self.s3.generate_presigned_post(
+            self.bucket, key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, MAX_UPLOAD_BYTES]],
+            ExpiresIn=S3_PRESIGN_EXPIRY
+        )
+
+    async def serve(self, key: str):
+        # Upload names are random and never reused, so public URLs can be cached for long
+        if S3_PUBLIC_BASE_URL:
+            return RedirectResponse(f"{S3_PUBLIC_BASE_URL}/{key}", status_code=301,
+                                    headers={"Cache-Control": "public, max-age=31536000, immutable"})
+        url = self.s3.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=S3_PRESIGN_EXPIRY
+        )
+        return RedirectResponse(url, status_code=307,
+                                headers={"Cache-Control": f"private, max-age={S3_PRESIGN_EXPIRY // 2}"})
+
+_storage = None
+
+def get_storage():
+    """This worker's storage backend, created on first use"""
+    global _storage
+    if _storage is None:
+        _storage = S3Storage(S3_BUCKET) if STORAGE_BACKEND == 's3' else LocalStorage(UPLOAD_DIR)
+    return _storage
+
+def new_upload_name(content_type: str) -> str:
+    if content_type not in IMAGE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed.")
+    return f"{uuid.uuid4().hex}.{IMAGE_EXTENSIONS[content_type]}"
 
 @api_router.post("/upload-image")
 async def upload_image(file: UploadFile = File(...)):
     """Upload an image and return its URL"""
-    # Validate file type
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
-        raise HTTPException(status_code=400, detail="Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed.")
-    
-    # Generate unique filename
-    file_ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    unique_filename = f"{uuid.uuid4().hex}.{file_ext}"
-    file_path = UPLOAD_DIR / unique_filename
-    
-    # Save file
-    content = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
-    # Return URL (this will be served statically)
+    unique_filename = new_upload_name(file.content_type)
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    # Stream the spooled upload to storage instead of reading it into memory
+    await get_storage().save_stream(unique_filename, file.file, file.content_type)
+
+    # Return URL (served directly or by redirect to storage)
     return {"url": f"/api/uploads/{unique_filename}", "filename": unique_filename}
 
-from fastapi.responses import FileResponse
+@api_router.post("/uploads/presign")
+async def presign_upload(upload_data: dict):
+    """Direct-to-storage upload form; the file bytes never pass through the API"""
+    unique_filename = new_upload_name(upload_data.get('content_type'))
+    form = get_storage().presign_upload(unique_filename, upload_data['content_type'])
+    if form is None:
+        return {"method": "POST", "url": "/api/upload-image", "fields": {}, "direct": False}
+    return {
+        "method": "POST",
+        "url": form['url'],
+        "fields": form['fields'],
+        "direct": True,
+        "file_url": f"/api/uploads/{unique_filename}",
+        "filename": unique_filename
+    }
 
 @api_router.get("/uploads/{filename}")
 async def get_uploaded_file(filename: str):
     """Serve uploaded files"""
-    file_path = UPLOAD_DIR / filename
-    if not file_path.exists():
+    if not UPLOAD_NAME_PATTERN.match(filename):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path)
+    return await get_storage().serve(filename)
 
 # ==================== ADDITIONAL DELETE ROUTES ====================
 
@@ -1105,34 +4132,440 @@ async def get_uploaded_file(filename: str):
 async def delete_member(member_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete members")
-    result = await db.members.delete_one({"id": member_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("members", member_id):
         raise HTTPException(status_code=404, detail="Member not found")
+    publish_change("members", "delete", {"id": member_id})
     return {"message": "Member deleted successfully"}
 
 @api_router.delete("/donations/{donation_id}")
 async def delete_donation(donation_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete donations")
-    result = await db.donations.delete_one({"id": donation_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("donations", donation_id):
         raise HTTPException(status_code=404, detail="Donation not found")
+    publish_change("donations", "delete", {"id": donation_id})
     return {"message": "Donation deleted successfully"}
 
 @api_router.delete("/certificates/{certificate_id}")
 async def delete_certificate(certificate_id: str, user_data: dict = Depends(verify_token)):
     if user_data['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can delete certificates")
-    result = await db.certificates.delete_one({"id": certificate_id})
-    if result.deleted_count == 0:
+    if not await soft_delete("certificates", certificate_id):
         raise HTTPException(status_code=404, detail="Certificate not found")
     return {"message": "Certificate deleted successfully"}
 
+# ==================== JOB SCHEDULER ====================
+
+# Periodic and one-shot jobs shared by all workers: each due job is leased to one worker in
+# scheduled_jobs, so a sweep runs once per schedule no matter how many workers are up.
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '5'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '300'))
+JOB_SWEEP_BATCH = int(os.environ.get('JOB_SWEEP_BATCH', '500'))
+EVENT_REMINDER_HOURS = int(os.environ.get('EVENT_REMINDER_HOURS', '24'))
+ORDER_EXPIRY_MINUTES = int(os.environ.get('ORDER_EXPIRY_MINUTES', '120'))
+
+JOB_RUNS = Counter("scheduled_job_runs_total", "Scheduled job runs by outcome", ("job", "status"))
+JOB_DURATION = Histogram("scheduled_job_duration_seconds", "Scheduled job run time", ("job",))
+
+CRON_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+def parse_cron_field(field: str, low: int, high: int) -> set:
+    values = set()
+    for part in field.split(","):
+        spec, _, step = part.partition("/")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (int(v) for v in spec.split("-", 1))
+        else:
+            start = end = int(spec)
+            if step:
+                end = high
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field {field!r} is out of range {low}-{high}")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return values
+
+class CronSchedule:
+    """minute hour day-of-month month day-of-week, in UTC; Sunday is 0"""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} needs five fields")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)
+        )
+        # As in cron, a restricted day-of-month and day-of-week match if either one does
+        self.any_day = fields[2] == "*" or fields[4] == "*"
+
+    def day_matches(self, moment: datetime) -> bool:
+        in_month = moment.day in self.days
+        in_week = (moment.weekday() + 1) % 7 in self.weekdays
+        return (in_month and in_week) if self.any_day else (in_month or in_week)
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self.day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+    def __str__(self):
+        return self.expression
+
+class IntervalSchedule:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f"every {self.seconds:g}s"
+
+async def expire_campaigns() -> int:
+    """Close active campaigns whose end date has passed"""
+    now = datetime.now(timezone.utc)
+    result = await db.campaigns.update_many(
+        {"status": "active", "deleted_at": None, **date_match("end_date", "$lt", now)},
+        {"$set": {"status": "ended", "ended_at": now}}
+    )
+    if result.modified_count:
+        invalidate_home("campaigns")
+    return result.modified_count
+
+async def send_event_reminders() -> int:
+    """Queue a reminder broadcast to members for each event starting within EVENT_REMINDER_HOURS"""
+    now = datetime.now(timezone.utc)
+    events = await db.events.find(
+        {"deleted_at": None, "reminder_queued_at": None,
+         **date_range("event_date", now, now + timedelta(hours=EVENT_REMINDER_HOURS))},
+        {"_id": 0, "id": 1, "title": 1, "event_date": 1, "location": 1}
+    ).to_list(JOB_SWEEP_BATCH)
+
+    queued = 0
+    for event in events:
+        # Claim the event first, so a reminder is never queued twice
+        claimed = await db.events.update_one(
+            {"id": event['id'], "reminder_queued_at": None}, {"$set": {"reminder_queued_at": now}}
+        )
+        if not claimed.modified_count:
+            continue
+        starts = parse_stored_date(event['event_date'])
+        await queue_broadcast(BroadcastCreate(
+            subject=f"Reminder: {event['title']}",
+            message=f"{event['title']} takes place on {starts:%d %B %Y at %H:%M} UTC at {event['location']}. We look forward to seeing you there.",
+            audience=BroadcastAudience(type="members")
+        ), "scheduler")
+        queued += 1
+    return queued
+
+async def expire_stale_orders() -> int:
+    """Mark one-off checkout orders that were never paid as expired"""
+    now = datetime.now(timezone.utc)
+    # Subscription charge rows are retried by charge_due_subscriptions, which never retries expired ones
+    result = await db.donations.update_many(
+        {"status": "pending", "subscription_id": None, **date_match("created_at", "$lt", now - timedelta(minutes=ORDER_EXPIRY_MINUTES))},
+        {"$set": {"status": "expired", "expired_at": now}}
+    )
+    return result.modified_count
+
+# name -> (handler, schedule); a one-shot job can run any of these handlers
+SCHEDULED_JOBS = {
+    "expire_campaigns": (expire_campaigns, CronSchedule(os.environ.get('EXPIRE_CAMPAIGNS_CRON', '*/10 * * * *'))),
+    "send_event_reminders": (send_event_reminders, CronSchedule(os.environ.get('EVENT_REMINDERS_CRON', '*/15 * * * *'))),
+    "expire_stale_orders": (expire_stale_orders, CronSchedule(os.environ.get('EXPIRE_ORDERS_CRON', '*/5 * * * *'))),
+    "refresh_referral_leaderboard": (refresh_referral_leaderboard, IntervalSchedule(REFERRAL_LEADERBOARD_REFRESH_SECONDS)),
+    "archive_cold_data": (run_archiver, IntervalSchedule(ARCHIVE_INTERVAL_SECONDS)),
+    "charge_subscriptions": (charge_due_subscriptions, CronSchedule(os.environ.get('SUBSCRIPTION_CHARGE_CRON', '*/15 * * * *'))),
+}
+
+async def sync_jobs():
+    """Register the periodic jobs, keeping the next run time of ones that already exist"""
+    now = datetime.now(timezone.utc)
+    for name, (_, schedule) in SCHEDULED_JOBS.items():
+        try:
+            await db.scheduled_jobs.update_one(
+                {"name": name},
+                {
+                    "$set": {"handler": name, "schedule": str(schedule)},
+                    "$setOnInsert": {"name": name, "next_run_at": now, "lease_owner": None, "lease_until": None, "runs": 0}
+                },
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass  # another worker registered it first
+    await db.scheduled_jobs.delete_many({"schedule": {"$ne": None}, "name": {"$nin": list(SCHEDULED_JOBS)}})
+
+async def schedule_once(handler: str, run_at, **payload) -> str:
+    """Run a job handler once at `run_at`"""
+    name = f"{handler}:{uuid.uuid4().hex[:12]}"
+    await db.scheduled_jobs.insert_one({
+        "name": name,
+        "handler": handler,
+        "schedule": None,
+        "payload": payload,
+        "next_run_at": parse_stored_date(run_at),
+        "lease_owner": None,
+        "lease_until": None,
+        "runs": 0
+    })
+    return name
+
+async def claim_job(owner: str) -> Optional[dict]:
+    """Lease the most overdue job; the conditional update decides between racing workers"""
+    now = datetime.now(timezone.utc)
+    due = {"next_run_at": {"$ne": None, "$lte": now}, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]}
+    candidates = await db.scheduled_jobs.find(due, {"_id": 0}).sort("next_run_at", 1).to_list(10)
+    for job in candidates:
+        claimed = await db.scheduled_jobs.update_one(
+            {"name": job['name'], **due},
+            {"$set": {"lease_owner": owner, "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)}}
+        )
+        if claimed.modified_count:
+            return job
+    return None
+
+async def keep_job_lease(name: str, owner: str):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        await db.scheduled_jobs.update_one(
+            {"name": name, "lease_owner": owner},
+            {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)}}
+        )
+
+async def run_job(job: dict, owner: str):
+    handler = job['handler']
+    heartbeat = asyncio.create_task(keep_job_lease(job['name'], owner))
+    started = time.perf_counter()
+    status, error, result = "ok", None, None
+    try:
+        result = await SCHEDULED_JOBS[handler][0](**job.get('payload', {}))
+    except Exception as e:
+        status, error = "failed", str(e)
+        logger.error("Job %s failed: %s", job['name'], e)
+    finally:
+        heartbeat.cancel()
+    elapsed = time.perf_counter() - started
+    JOB_RUNS.inc((handler, status))
+    JOB_DURATION.observe((handler,), elapsed)
+
+    now = datetime.now(timezone.utc)
+    update = {
+        "lease_owner": None,
+        "lease_until": None,
+        "last_run_at": now,
+        "last_status": status,
+        "last_error": error,
+        "last_result": result,
+        "last_duration_ms": round(elapsed * 1000, 1)
+    }
+    if job.get('schedule'):
+        update['next_run_at'] = SCHEDULED_JOBS[handler][1].next_after(now)
+    else:
+        update['next_run_at'] = None  # one-shot jobs stay listed with their outcome until purged
+        update['purge_at'] = now + timedelta(days=7)
+    await db.scheduled_jobs.update_one({"name": job['name'], "lease_owner": owner}, {"$set": update, "$inc": {"runs": 1}})
+
+async def job_scheduler_loop():
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    synced = False
+    while True:
+        try:
+            if not synced:
+                await sync_jobs()
+                synced = True
+            job = await claim_job(owner)
+            if job:
+                await run_job(job, owner)
+                continue
+        except Exception as e:
+            logger.error("Job scheduler error: %s", e)
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+@api_router.get("/admin/jobs")
+async def list_jobs(user_data: dict = Depends(verify_token)):
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    return await db.scheduled_jobs.find({}, {"_id": 0, "purge_at": 0}).sort("next_run_at", 1).to_list(500)
+
+@api_router.post("/admin/jobs/{name}/run")
+async def run_job_now(name: str, user_data: dict = Depends(verify_token)):
+    """Bring a periodic job's next run forward to now"""
+    if user_data['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Only admin allowed")
+    if name not in SCHEDULED_JOBS:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    await db.scheduled_jobs.update_one({"name": name}, {"$set": {"next_run_at": datetime.now(timezone.utc)}})
+    return {"message": "Job scheduled", "name": name}
+
+# ==================== SYSTEM ROUTES ====================
+
 # Root route
-@app.get("/")
+@system_router.get("/")
 async def root():
     return {"message": "NVP Welfare Foundation India API", "status": "running"}
 
+@system_router.get("/health/live")
+async def liveness():
+    """Process is up and serving; used to decide restarts"""
+    return {"status": "alive"}
+
+@system_router.get("/health/ready")
+async def readiness(request: Request):
+    """Worker has warmed up and can reach Mongo; used to route traffic"""
+    if not getattr(request.app.state, 'ready', False):
+        return JSONResponse({"status": "not ready"}, status_code=503)
+    try:
+        await asyncio.wait_for(db.command('ping'), timeout=2)
+    except Exception as e:
+        logger.warning("Readiness check failed: %s", e)
+        return JSONResponse({"status": "database unavailable"}, status_code=503)
+    return {"status": "ready"}
+
+@system_router.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and request.headers.get('authorization') != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ==================== APPLICATION LIFECYCLE ====================
+
+# How long uvicorn lets open connections finish after a shutdown signal (timeout_graceful_shutdown)
+DRAIN_TIMEOUT_SECONDS = float(os.environ.get('DRAIN_TIMEOUT_SECONDS', '25'))
+SHUTDOWN_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+# Periodic jobs every worker runs for its lifetime
+BACKGROUND_LOOPS = [job_scheduler_loop, live_feed_loop, broadcast_loop] + [email_worker_loop] * EMAIL_WORKERS
+# Awaited in lifespan shutdown, after uvicorn has drained connections, to flush queued work
+SHUTDOWN_HOOKS = [flush_email_queue, close_email_transport, close_gateway_executor]
+
+async def ensure_indexes():
+    await db.users.create_index("id")
+    await db.users.create_index("email")
+    await db.members.create_index("id")
+    await db.members.create_index("member_number")
+    await db.members.create_index([("status", 1), ("joined_at", -1)])
+    await db.members.create_index([("designation", 1), ("status", 1), ("joined_at", -1)])
+    await db.members.create_index([("city", 1), ("status", 1), ("joined_at", -1)])
+    await db.members.create_index("ancestors")
+    await db.members.create_index("referrer_id")
+    await db.donations.create_index([("referrer_path", 1), ("status", 1)])
+    await db.referral_leaderboard.create_index("rank", unique=True)
+    await db.enquiries.create_index([("status", 1), ("created_at", 1)])
+    await db.donations.create_index("receipt_number", unique=True)
+    await db.receipts.create_index("receipt_number", unique=True)
+    await db.certificates.create_index("certificate_number", unique=True)
+    await db.donations.create_index([("status", 1), ("created_at", 1)])
+    for name in SOFT_DELETE_COLLECTIONS:
+        # Only deleted documents are indexed, so the trash view costs nothing for live data
+        await db[name].create_index("deleted_at", partialFilterExpression={"deleted_at": {"$exists": True}})
+        await db[name].create_index("purge_at", expireAfterSeconds=0)
+    await db.donations_archive.create_index("purge_at", expireAfterSeconds=0)
+    await db.donations_archive.create_index("id")
+    await db.enquiries_archive.create_index("id")
+    await db.donations.create_index([("campaign_id", 1), ("status", 1)])
+    await db.broadcasts.create_index([("status", 1), ("created_at", 1)])
+    await db.broadcasts.create_index("id")
+    await db.broadcast_deliveries.create_index([("broadcast_id", 1), ("email", 1)], unique=True)
+    await db.broadcast_deliveries.create_index([("broadcast_id", 1), ("status", 1)])
+    await db.broadcast_deliveries.create_index("id")
+    await db.expenses.create_index("id")
+    await db.expenses.create_index([("project_id", 1), ("expense_date", -1)])
+    await db.expenses.create_index([("expense_date", -1)])
+    # At most one reversal per entry
+    await db.expenses.create_index("reverses", unique=True, partialFilterExpression={"reverses": {"$type": "string"}})
+    await db.schema_migrations.create_index("version", unique=True)
+    await db.scheduled_jobs.create_index("name", unique=True)
+    await db.donor_profiles.create_index("key", unique=True)
+    await db.donor_profiles.create_index([("lifetime_paise", -1)])
+    await db.donations.create_index([("donor_email", 1), ("created_at", -1)])
+    await db.donations.create_index("charge_key", unique=True, partialFilterExpression={"charge_key": {"$type": "string"}})
+    await db.subscriptions.create_index("id")
+    await db.subscriptions.create_index([("status", 1), ("next_charge_at", 1)])
+    await db.subscriptions.create_index("donor_key")
+    await db.scheduled_jobs.create_index("next_run_at")
+    await db.scheduled_jobs.create_index("purge_at", expireAfterSeconds=0)
+    await db.campaigns.create_index([("status", 1), ("end_date", 1)])
+    await db.events.create_index([("reminder_queued_at", 1), ("event_date", 1)])
+
+async def warm_up():
+    """Open pool connections and build indexes before taking traffic"""
+    await db.command('ping')
+    await ensure_indexes()
+    load_email_templates()
+
+def begin_shutdown(app: FastAPI):
+    """First step of a shutdown: stop reporting ready while open requests finish"""
+    app.state.ready = False
+    # Live feed streams never finish on their own and would hold the drain until they time out
+    live_feed.close()
+
+def install_shutdown_signals(app: FastAPI) -> dict:
+    """Call begin_shutdown() as soon as the worker gets SIGINT or SIGTERM.
+
+    uvicorn only runs lifespan shutdown once open connections have drained, which is too late for
+    this. Its own handler still runs: the one installed before is chained, and asyncio's handlers
+    are woken through the signal wakeup fd whichever Python handler is set. Returns the previous
+    handlers for restore_signals().
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+    loop = asyncio.get_running_loop()
+    previous = {}
+
+    def handler(sig, frame):
+        loop.call_soon_threadsafe(begin_shutdown, app)
+        if callable(previous.get(sig)):
+            previous[sig](sig, frame)
+
+    for sig in SHUTDOWN_SIGNALS:
+        previous[sig] = signal.signal(sig, handler)
+    return previous
+
+def restore_signals(previous: dict):
+    for sig, handler in previous.items():
+        signal.signal(sig, handler)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    client = create_mongo_client()
+    db = client[DB_NAME]
+    await warm_up()
+
+    app.state.background_tasks = [asyncio.create_task(loop()) for loop in BACKGROUND_LOOPS]
+    previous_signals = install_shutdown_signals(app)
+    app.state.ready = True
+    logger.info("Worker %s ready", os.getpid())
+    try:
+        yield
+    finally:
+        # Servers that don't signal first (and tests) only get here
+        begin_shutdown(app)
+        restore_signals(previous_signals)
+        for task in app.state.background_tasks:
+            task.cancel()
+        await asyncio.gather(*app.state.background_tasks, return_exceptions=True)
+        for hook in SHUTDOWN_HOOKS:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error("Shutdown hook %s failed: %s", hook.__name__, e)
+        client.close()
+
 # Include router
 # app.include_router(api_router)
 
@@ -1150,38 +4583,63 @@ origins_env = os.environ.get('CORS_ORIGINS',
 )
 origins = [o.strip() for o in origins_env.split(',') if o.strip()]
 
-@app.middleware("http")
 async def log_preflight(request, call_next):
     if request.method == "OPTIONS":
         logger.info("OPTIONS request headers: %s", dict(request.headers))
     return await call_next(request)
 
+def create_app() -> FastAPI:
+    """Build the ASGI app. Safe to run in several workers, e.g.
+    `uvicorn server:create_app --factory --workers 4`, since all clients
+    are created per process in lifespan. Behind a proxy also pass
+    `--forwarded-allow-ips <proxy ip>` (or set FORWARDED_ALLOW_IPS) so rate
+    limits see the real client address.
+    """
+    app = FastAPI(lifespan=lifespan)
+    if PROFILING_ENABLED:
+        # Added first so it is innermost, in the task that runs the route
+        app.add_middleware(ProfilingMiddleware)
+    app.middleware("http")(log_preflight)
+    # Inside CORS, so browsers can read the 503s and 429s these send
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(RateLimitMiddleware)
+
+    app.add_middleware(
+        CORSMiddleware,
+           allow_origins=[
+            "http://localhost:3000",
+            "http://0.0.0.0:8000",
+            "https://ngo-3-freelancing-project-ye1a.vercel.app",
+            "https://nvpwfoundationindia.co.in",
+        ],
+        allow_credentials=False,     # only if you need cookies/auth
+        allow_methods=["*"],        # allow OPTIONS, POST, GET, etc.
+        allow_headers=["*"],
+        max_age=3600,
+    )
 
-app.add_middleware(
-    CORSMiddleware,
-       allow_origins=[
-        "http://localhost:3000",
-        "http://0.0.0.0:8000",
-        "https://ngo-3-freelancing-project-ye1a.vercel.app",
-        "https://nvpwfoundationindia.co.in",
-    ],
-    allow_credentials=False,     # only if you need cookies/auth
-    allow_methods=["*"],        # allow OPTIONS, POST, GET, etc.
-    allow_headers=["*"],
-    max_age=3600,
-)
-
-app.include_router(api_router)
-
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
-
-
+    app.add_middleware(CompressionMiddleware)
+    # Added last so it wraps everything, including CORS handling
+    app.add_middleware(MetricsMiddleware)
+
+    app.include_router(api_router)
+    app.include_router(system_router)
+    return app
+
+app = create_app()
+
+if __name__ == "__main__" and sys.argv[1:2] == ["migrate"]:
+    asyncio.run(migrate_all())
+elif __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "server:create_app",
+        factory=True,
+        host="0.0.0.0",
+        port=int(os.environ.get('PORT', '8000')),
+        workers=int(os.environ.get('WEB_CONCURRENCY', '1')),
+        timeout_graceful_shutdown=int(DRAIN_TIMEOUT_SECONDS),
+        # Rate limits key on the client address, so trust X-Forwarded-For from the proxy in front of us
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+    )
@@ -0,0 +1,468 @@
+"""Load-testing and benchmark suite for the NGO API.
+
+Runs the FastAPI app in-process (no network hop) against a local MongoDB or
+mongomock-motor, with Resend and Razorpay replaced by fakes, and drives a
+mixed workload of public page views, login bursts, donation order/verify
+flows and admin list views.
+
+    python backend_bench.py --mock                  # compare against baseline
+    python backend_bench.py --mock --save-baseline  # record a new baseline
+    python backend_bench.py --mongo-url mongodb://localhost:27017
+    python backend_bench.py --startup               # cold-start import time and RSS
+    python backend_bench.py --mock --compression    # response size vs compression CPU
+
+Exits non-zero when any route's p95 latency or throughput regresses past the
+tolerance recorded next to the baseline.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+BASELINE_PATH = ROOT_DIR / "benchmarks" / "api_baseline.json"
+STARTUP_BASELINE_PATH = ROOT_DIR / "benchmarks" / "startup_baseline.json"
+IMPORTTIME_REPORT_PATH = ROOT_DIR / "benchmarks" / "importtime.txt"
+COMPRESSION_REPORT_PATH = ROOT_DIR / "benchmarks" / "compression.txt"
+
+ADMIN_EMAIL = "bench-admin@example.com"
+MEMBER_PASSWORD = "Bench@123"
+
+# (name, weight) - weights roughly follow production traffic
+WORKLOADS = [
+    ("public_views", 60),
+    ("donation_flow", 15),
+    ("admin_lists", 15),
+    ("login_burst", 10),
+]
+
+
+class FakeRazorpayOrders:
+    def create(self, data):
+        return {"id": f"order_{uuid.uuid4().hex[:14]}", "amount": data["amount"], "currency": data["currency"]}
+
+
+class FakeRazorpayUtility:
+    def verify_payment_signature(self, params):
+        if params["razorpay_signature"] != f"sig_{params['razorpay_payment_id']}":
+            from razorpay.errors import SignatureVerificationError
+            raise SignatureVerificationError("Razorpay Signature Verification Failed")
+        return True
+
+
+class FakeRazorpayClient:
+    def __init__(self):
+        self.order = FakeRazorpayOrders()
+        self.utility = FakeRazorpayUtility()
+
+
+class FakeEmailTransport:
+    async def send(self, message):
+        # Roughly the cost of a fast HTTPS call on a warm connection
+        await asyncio.sleep(0.002)
+
+    async def close(self):
+        pass
+
+
+def load_server(args):
+    os.environ.setdefault("MONGO_URL", args.mongo_url)
+    os.environ["DB_NAME"] = args.db_name
+    # Every simulated client shares one address, so per-IP limits would only measure 429s
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+    # Slow bcrypt logins push payment latency over the SLO and the admin reads would be shed as 503s
+    os.environ["ADMISSION_ENABLED"] = "0"
+    sys.path.insert(0, str(ROOT_DIR / "backend"))
+    import server
+
+    # Per-request INFO logging would dominate the profile
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Swap the per-worker client factories so lifespan wires in the fakes
+    if args.mock:
+        from mongomock_motor import AsyncMongoMockClient
+        server.create_mongo_client = AsyncMongoMockClient
+    server.create_razorpay_client = FakeRazorpayClient
+    server.create_email_transport = FakeEmailTransport
+    return server
+
+
+async def seed(server, rng):
+    db = server.db
+    for name in ["users", "members", "donations", "news", "campaigns", "events", "activities", "enquiries"]:
+        await db[name].delete_many({})
+
+    now = server.datetime.now(server.timezone.utc).isoformat()
+    password_hash = server.hash_password(MEMBER_PASSWORD)
+    admin = server.User(email=ADMIN_EMAIL, password_hash=password_hash, name="Bench Admin", phone="9000000000", role="admin")
+    users = [admin]
+    for i in range(50):
+        users.append(server.User(email=f"member{i}@example.com", password_hash=password_hash, name=f"Member {i}", phone="9000000001"))
+    docs = []
+    for user in users:
+        doc = user.model_dump()
+        doc["created_at"] = doc["created_at"].isoformat()
+        docs.append(doc)
+    await db.users.insert_many(docs)
+
+    await db.members.insert_many([
+        {"id": str(uuid.uuid4()), "user_id": u.id, "member_number": f"SM{i:06d}", "designation": "Volunteer",
+         "designation_fee": 500.0, "city": rng.choice(["Delhi", "Jaipur", "Lucknow"]), "ancestors": [],
+         "status": rng.choice(["pending", "approved"]), "joined_at": now}
+        for i, u in enumerate(users[1:], start=1)
+    ])
+    body = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40
+    await db.news.insert_many([
+        {"id": str(uuid.uuid4()), "title": f"News {i}", "content": body, "author_id": admin.id, "published": True,
+         "created_at": now} for i in range(60)
+    ])
+    await db.activities.insert_many([
+        {"id": str(uuid.uuid4()), "title": f"Activity {i}", "description": body, "images": [f"/api/uploads/{i}.png"] * 6,
+         "author_id": admin.id, "created_at": now} for i in range(60)
+    ])
+    await db.campaigns.insert_many([
+        {"id": str(uuid.uuid4()), "title": f"Campaign {i}", "description": body, "goal_amount": 100000.0,
+         "current_amount": 0.0, "start_date": now, "end_date": now, "status": "active", "created_at": now}
+        for i in range(20)
+    ])
+    await db.events.insert_many([
+        {"id": str(uuid.uuid4()), "title": f"Event {i}", "description": body, "event_date": now, "location": "Delhi",
+         "registration_fee": 0.0, "is_paid": False, "registered_count": 0, "created_at": now} for i in range(20)
+    ])
+    await db.donations.insert_many([
+        {"id": str(uuid.uuid4()), "donor_name": f"Donor {i}", "donor_email": f"donor{i % 40}@example.com",
+         "donor_phone": "9000000002", "amount": float(rng.choice([100, 500, 1000, 5000])), "payment_method": "online",
+         "order_id": f"order_seed_{i}", "status": "completed", "receipt_number": f"SM-SEED-{i:06d}",
+         "referrer_path": [], "created_at": now} for i in range(500)
+    ])
+    await db.enquiries.insert_many([
+        {"id": str(uuid.uuid4()), "name": f"Visitor {i}", "email": f"visitor{i}@example.com", "phone": "9000000003",
+         "message": body[:300], "status": "pending", "created_at": now} for i in range(200)
+    ])
+    return admin, users[1:]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, client, method, url, route, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        key = f"{method} {route}"
+        self.samples.setdefault(key, []).append(elapsed)
+        if response.status_code >= 400:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        return response
+
+
+async def public_views(client, rec, ctx):
+    for route in ctx["rng"].sample(["/api/stats", "/api/news", "/api/campaigns", "/api/events", "/api/activities"], 3):
+        await rec.call(client, "GET", route, route)
+
+
+async def donation_flow(client, rec, ctx):
+    rng = ctx["rng"]
+    response = await rec.call(client, "POST", "/api/donations/create-order", "/api/donations/create-order", json={
+        "amount": rng.choice([101, 251, 501, 1100]), "donor_name": "Bench Donor",
+        "donor_email": f"donor{rng.randrange(40)}@example.com", "donor_phone": "9000000002", "purpose": "general",
+    })
+    if response.status_code == 200:
+        payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+        await rec.call(client, "POST", "/api/donations/verify-payment", "/api/donations/verify-payment", json={
+            "order_id": response.json()["order_id"], "payment_id": payment_id, "signature": f"sig_{payment_id}",
+        })
+
+
+async def admin_lists(client, rec, ctx):
+    headers = {"Authorization": f"Bearer {ctx['admin_token']}"}
+    for route in ["/api/donations", "/api/members", "/api/enquiries", "/api/users/members"]:
+        await rec.call(client, "GET", route, route, headers=headers)
+
+
+async def login_burst(client, rec, ctx):
+    member = ctx["rng"].choice(ctx["members"])
+    await asyncio.gather(*[
+        rec.call(client, "POST", "/api/auth/login", "/api/auth/login",
+                 json={"email": member.email, "password": MEMBER_PASSWORD})
+        for _ in range(3)
+    ])
+
+
+async def run(args):
+    server = load_server(args)
+    async with server.app.router.lifespan_context(server.app):
+        return await run_workload(server, args)
+
+
+async def run_workload(server, args):
+    import httpx
+
+    rng = random.Random(args.seed)
+    admin, members = await seed(server, rng)
+    ctx = {
+        "rng": rng,
+        "members": members,
+        "admin_token": server.create_jwt_token(admin.id, admin.email, admin.role),
+    }
+    flows = {"public_views": public_views, "donation_flow": donation_flow,
+             "admin_lists": admin_lists, "login_burst": login_burst}
+    names = [name for name, _ in WORKLOADS]
+    weights = [weight for _, weight in WORKLOADS]
+    plan = rng.choices(names, weights=weights, k=args.iterations)
+
+    rec = Recorder()
+    queue = asyncio.Queue()
+    for name in plan:
+        queue.put_nowait(name)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        async def worker():
+            while not queue.empty():
+                await flows[queue.get_nowait()](client, rec, ctx)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        wall = time.perf_counter() - start
+    return rec, wall
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(rec, wall):
+    report = {}
+    for key, values in sorted(rec.samples.items()):
+        values = sorted(values)
+        report[key] = {
+            "count": len(values),
+            "errors": rec.errors.get(key, 0),
+            "rps": round(len(values) / wall, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    return report
+
+
+def print_report(report, wall):
+    print(f"{'route':45} {'count':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for key, row in report.items():
+        print(f"{key:45} {row['count']:>6} {row['errors']:>4} {row['rps']:>8} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}")
+    total = sum(row["count"] for row in report.values())
+    print(f"\n{total} requests in {wall:.2f}s ({total / wall:.1f} req/s)")
+
+
+# Allowed regression ratio per metric; tail latency is noisier than the median
+DEFAULT_TOLERANCE = {"p50_ms": 0.5, "p95_ms": 1.0, "rps": 0.3}
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for key, base in baseline["routes"].items():
+        row = report.get(key)
+        if not row:
+            regressions.append(f"{key}: missing from this run")
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if row[metric] > base[metric] * (1 + tolerance[metric]):
+                regressions.append(f"{key}: {metric} {row[metric]} > baseline {base[metric]}")
+        if row["rps"] < base["rps"] * (1 - tolerance["rps"]):
+            regressions.append(f"{key}: {row['rps']} req/s < baseline {base['rps']} req/s")
+        if row["errors"] > base.get("errors", 0):
+            regressions.append(f"{key}: {row['errors']} errors (baseline {base.get('errors', 0)})")
+    return regressions
+
+
+STARTUP_PROBE = (
+    "import time, resource; start = time.perf_counter(); import server; "
+    "print(round((time.perf_counter() - start) * 1000, 1), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)"
+)
+
+
+def measure_startup(runs):
+    """Import server.py in fresh interpreters and return median import ms and peak RSS MB"""
+    import statistics
+    import subprocess
+
+    env = dict(os.environ, MONGO_URL=os.environ.get("MONGO_URL", "mongodb://localhost:27017"), DB_NAME="ngo_bench")
+    import_ms, rss_mb = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=ROOT_DIR / "backend", env=env,
+                             capture_output=True, text=True, check=True).stdout.split()
+        import_ms.append(float(out[-2]))
+        rss_mb.append(int(out[-1]))
+    importtime = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], cwd=ROOT_DIR / "backend",
+                                env=env, capture_output=True, text=True, check=True).stderr
+    return statistics.median(import_ms), max(rss_mb), importtime
+
+
+def importtime_report(raw, top=30):
+    """Summarize `python -X importtime` output as the slowest imports by cumulative time"""
+    rows = []
+    for line in raw.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|").split("|")]
+        rows.append((int(cumulative_us), int(self_us), name))
+    rows.sort(reverse=True)
+    lines = [f"{'cumulative ms':>14} {'self ms':>9}  module", "-" * 60]
+    lines += [f"{cumulative / 1000:>14.1f} {own / 1000:>9.1f}  {name}" for cumulative, own, name in rows[:top]]
+    return "\n".join(lines) + "\n"
+
+
+def run_startup(args):
+    import_ms, rss_mb, raw = measure_startup(args.startup_runs)
+    print(f"cold import of server.py: {import_ms} ms (median of {args.startup_runs}), peak RSS {rss_mb} MB")
+    print(importtime_report(raw, top=15))
+
+    if args.save_baseline:
+        STARTUP_BASELINE_PATH.parent.mkdir(exist_ok=True)
+        # Targets leave headroom for slower hosts; the report records the measured numbers
+        baseline = {"import_ms": import_ms, "rss_mb": rss_mb,
+                    "target_import_ms": round(import_ms * 1.5), "target_rss_mb": round(rss_mb * 1.25)}
+        STARTUP_BASELINE_PATH.write_text(json.dumps(baseline, indent=2) + "\n")
+        IMPORTTIME_REPORT_PATH.write_text(
+            f"# python -X importtime -c 'import server'  ({import_ms} ms median, {rss_mb} MB peak RSS)\n"
+            + importtime_report(raw)
+        )
+        print(f"Startup baseline saved to {STARTUP_BASELINE_PATH}")
+        return 0
+
+    if not STARTUP_BASELINE_PATH.exists():
+        print("No startup baseline found, run with --startup --save-baseline first")
+        return 0
+    baseline = json.loads(STARTUP_BASELINE_PATH.read_text())
+    failures = []
+    if import_ms > baseline["target_import_ms"]:
+        failures.append(f"import time {import_ms} ms > target {baseline['target_import_ms']} ms")
+    if rss_mb > baseline["target_rss_mb"]:
+        failures.append(f"peak RSS {rss_mb} MB > target {baseline['target_rss_mb']} MB")
+    for line in failures:
+        print(f"  {line}")
+    return 1 if failures else 0
+
+
+COMPRESSION_ROUTES = ["/api/home", "/api/news", "/api/campaigns", "/api/donations", "/api/members", "/api/enquiries"]
+
+
+async def measure_compression(args, repeats=20):
+    """Fetch each route uncompressed, then time every encoding at its per-request and cached levels"""
+    import httpx
+
+    server = load_server(args)
+    rows = []
+    async with server.app.router.lifespan_context(server.app):
+        admin, _ = await seed(server, random.Random(args.seed))
+        headers = {"Authorization": f"Bearer {server.create_jwt_token(admin.id, admin.email, admin.role)}",
+                   "Accept-Encoding": "identity"}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for route in COMPRESSION_ROUTES:
+                body = (await client.get(route, headers=headers)).content
+                rows.append((route, "identity", "-", len(body), 0.0))
+                for encoding in server.COMPRESSION_PREFERENCE:
+                    for mode in ("dynamic", "cached"):
+                        start = time.process_time()
+                        for _ in range(repeats):
+                            size = len(server.compress_body(encoding, body, mode))
+                        cpu_ms = (time.process_time() - start) * 1000 / repeats
+                        rows.append((route, encoding, server.COMPRESSION_LEVELS[encoding][mode], size, cpu_ms))
+    return rows
+
+
+def compression_report(rows):
+    lines = [f"{'route':18} {'encoding':>8} {'level':>5} {'bytes':>9} {'ratio':>6} {'cpu ms':>8}", "-" * 60]
+    original = {}
+    for route, encoding, level, size, cpu_ms in rows:
+        original.setdefault(route, size)
+        lines.append(f"{route:18} {encoding:>8} {level:>5} {size:>9} {original[route] / size:>6.1f} {cpu_ms:>8.2f}")
+    return "\n".join(lines) + "\n"
+
+
+def run_compression(args):
+    report = compression_report(asyncio.run(measure_compression(args)))
+    print(report)
+    if args.save_baseline:
+        COMPRESSION_REPORT_PATH.write_text(
+            "# python backend_bench.py --mock --compression --save-baseline\n"
+            "# 'dynamic' levels run per request; 'cached' levels run once per cached body (/api/home)\n" + report
+        )
+        print(f"Compression report saved to {COMPRESSION_REPORT_PATH}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mock", action="store_true", help="use mongomock-motor instead of a live MongoDB")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="ngo_bench")
+    parser.add_argument("--iterations", type=int, default=300, help="number of workload flows to run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="allowed regression ratio for every metric (default: per-metric values in the baseline)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--startup", action="store_true", help="measure cold-start import time and memory instead")
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--compression", action="store_true",
+                        help="report response sizes and compression CPU per encoding instead")
+    args = parser.parse_args()
+
+    if args.startup:
+        return run_startup(args)
+    if args.compression:
+        return run_compression(args)
+
+    rec, wall = asyncio.run(run(args))
+    report = summarize(rec, wall)
+    print_report(report, wall)
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(exist_ok=True)
+        baseline = {
+            "mode": "mock" if args.mock else "mongo",
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "tolerance": DEFAULT_TOLERANCE,
+            "routes": report,
+        }
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("No baseline found, run with --save-baseline first")
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE)
+    if args.tolerance is not None:
+        tolerance = dict.fromkeys(DEFAULT_TOLERANCE, args.tolerance)
+    regressions = compare(report, baseline, tolerance)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -85,7 +85,7 @@ class NGOAPITester:
 
     def test_public_endpoints(self):
         """Test public endpoints that don't require auth"""
-        endpoints = ['news', 'campaigns', 'events']
+        endpoints = ['news', 'campaigns', 'events', 'referrals/leaderboard']
         results = {}
         
         for endpoint in endpoints:
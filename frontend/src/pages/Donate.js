@@ -69,6 +69,7 @@ const Donate = () => {
             await axios.post(`${API}/donations/verify-payment`, {
               order_id: order_id,
               payment_id: response.razorpay_payment_id,
+              signature: response.razorpay_signature,
             });
             toast.success("Donation successful! Receipt sent to your email.");
             setFormData({
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+class HeldApp:
+    """Inner app whose requests stay in flight until released"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started = 0
+
+    async def __call__(self, scope, receive, send):
+        self.started += 1
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def instant_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def call(middleware, path, method="GET"):
+    scope = {"type": "http", "method": method, "path": path, "headers": [], "query_string": b""}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    start = messages[0]
+    return start['status'], dict((k.decode(), v.decode()) for k, v in start['headers'])
+
+
+@pytest.fixture(autouse=True)
+def small_classes(monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_ENABLED", True)
+    monkeypatch.setitem(server.ADMISSION_CLASSES, "public_read", (4, 0.05, True))
+    monkeypatch.setitem(server.ADMISSION_CLASSES, "write", (1, 0.05, False))
+
+
+async def test_gate_hands_released_slot_to_first_waiter():
+    gate = server.AdmissionGate(1)
+    assert await gate.acquire(1) is True
+    first = asyncio.create_task(gate.acquire(1))
+    second = asyncio.create_task(gate.acquire(1))
+    await asyncio.sleep(0)
+    assert len(gate.waiters) == 2
+
+    gate.release()
+    assert await first is True
+    assert not second.done()
+    assert gate.active == 1
+
+    gate.release()
+    await second
+    gate.release()
+    assert gate.active == 0 and not gate.waiters
+
+
+async def test_gate_wait_times_out():
+    gate = server.AdmissionGate(1)
+    await gate.acquire(1)
+    with pytest.raises(asyncio.TimeoutError):
+        await gate.acquire(0.01)
+    assert not gate.waiters
+    gate.release()
+    assert gate.active == 0
+
+
+async def test_queue_timeout_is_503_with_retry_after():
+    app = HeldApp()
+    middleware = server.AdmissionMiddleware(app)
+    held = asyncio.create_task(call(middleware, "/api/news", "POST"))
+    await asyncio.sleep(0)
+
+    status, headers = await call(middleware, "/api/news", "POST")
+    assert status == 503
+    assert headers['retry-after'] == str(server.ADMISSION_RETRY_AFTER_SECONDS)
+
+    app.release.set()
+    assert (await held)[0] == 200
+
+
+async def test_sheddable_class_is_cut_to_half_under_pressure():
+    app = HeldApp()
+    middleware = server.AdmissionMiddleware(app)
+    middleware.pressure_until = time.monotonic() + 60
+    held = [asyncio.create_task(call(middleware, "/api/news")) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert app.started == 2
+
+    # Half of public_read's limit of 4 is in use, so the next one is shed without queueing
+    assert (await call(middleware, "/api/campaigns"))[0] == 503
+    app.release.set()
+    assert [(await task)[0] for task in held] == [200, 200]
+
+
+async def test_non_sheddable_class_still_served_under_pressure():
+    middleware = server.AdmissionMiddleware(instant_app)
+    middleware.pressure_until = time.monotonic() + 60
+    assert (await call(middleware, "/api/auth/login", "POST"))[0] == 200
+    assert (await call(middleware, "/api/enquiries", "POST"))[0] == 200
+
+
+async def test_slow_critical_requests_raise_pressure(monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_SLO_MS", 500)
+    middleware = server.AdmissionMiddleware(instant_app)
+
+    await call(middleware, "/api/donations/verify-payment", "POST")
+    assert not middleware.under_pressure()
+
+    # The moving average keeps 80% of the old value, so it stays over a 500ms SLO
+    middleware.critical_latency = 1.0
+    await call(middleware, "/api/donations/verify-payment", "POST")
+    assert middleware.under_pressure()
+    assert (await call(middleware, "/api/news"))[0] == 200  # nothing in flight, fits in half the limit
+
+
+async def test_waiting_critical_request_means_pressure():
+    middleware = server.AdmissionMiddleware(instant_app)
+    assert not middleware.under_pressure()
+    middleware.gates["critical"].waiters.append(asyncio.get_running_loop().create_future())
+    assert middleware.under_pressure()
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from server import CronSchedule
+
+
+def at(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("*/15 * * * *", at(2024, 1, 1, 10, 7, 30), at(2024, 1, 1, 10, 15)),
+    # Strictly after: a moment on the schedule moves to the next fire
+    ("*/15 * * * *", at(2024, 1, 1, 10, 15), at(2024, 1, 1, 10, 30)),
+    ("0 3 * * *", at(2024, 1, 1, 3, 0, 59), at(2024, 1, 2, 3, 0)),
+    # 2024-01-01 is a Monday
+    ("0 9 * * 1", at(2024, 1, 1, 9, 0), at(2024, 1, 8, 9, 0)),
+    ("30 2 1 * *", at(2024, 1, 31, 12, 0), at(2024, 2, 1, 2, 30)),
+    ("0 0 1 1 *", at(2024, 6, 1), at(2025, 1, 1)),
+    ("0 0 29 2 *", at(2024, 3, 1), at(2028, 2, 29)),
+    ("0 8-10/2 * * *", at(2024, 1, 1, 8, 30), at(2024, 1, 1, 10, 0)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+def test_restricted_day_of_month_and_week_match_either():
+    # The 13th, or any Friday; 2024-01-05 is a Friday and the 13th a Saturday
+    schedule = CronSchedule("0 0 13 * 5")
+    fires = [at(2024, 1, 1)]
+    for _ in range(3):
+        fires.append(schedule.next_after(fires[-1]))
+    assert fires[1:] == [at(2024, 1, 5), at(2024, 1, 12), at(2024, 1, 13)]
+
+
+def test_schedule_that_never_fires():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 30 2 *").next_after(at(2024, 1, 1))
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "0 0 0 * *", "0 5-2 * * *"])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
@@ -0,0 +1,70 @@
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+ADMIN = {"user_id": "admin-1", "email": "admin@example.com", "role": "admin"}
+
+
+async def add_project(db, **fields):
+    project = {"id": "p1", "title": "Clinic", "budget": 1000.0, "spent": 0.0, "remaining": 1000.0, "deleted_at": None}
+    project.update(fields)
+    await db.projects.insert_one(project)
+
+
+async def get_project(db):
+    return await db.projects.find_one({"id": "p1"}, {"_id": 0})
+
+
+async def test_expenses_roll_up_into_project(db):
+    await add_project(db)
+    await server.create_expense({"project_id": "p1", "category": "travel", "amount": 250.5, "description": "Bus"}, ADMIN)
+    await server.create_expense({"project_id": "p1", "category": "food", "amount": 100, "description": "Lunch"}, ADMIN)
+
+    project = await get_project(db)
+    assert project['spent_paise'] == 35050
+    assert project['spent'] == pytest.approx(350.5)
+    assert project['remaining'] == pytest.approx(649.5)
+    assert project['spent_paise_by_category'] == {"travel": 25050, "food": 10000}
+    assert project['expense_count'] == 2
+
+
+async def test_reversal_cancels_the_rollup(db):
+    await add_project(db)
+    created = await server.create_expense(
+        {"project_id": "p1", "category": "travel", "amount": 250.5, "description": "Bus"}, ADMIN
+    )
+    reversed_ = await server.reverse_expense(created['id'], {"description": "Wrong project"}, ADMIN)
+
+    project = await get_project(db)
+    assert project['spent_paise'] == 0
+    assert project['remaining'] == pytest.approx(1000)
+    assert project['spent_paise_by_category'] == {"travel": 0}
+    # Both entries stay in the ledger
+    assert project['expense_count'] == 2
+    reversal = await db.expenses.find_one({"id": reversed_['id']}, {"_id": 0})
+    assert reversal['amount'] == -250.5
+    assert reversal['reverses'] == created['id']
+    assert reversal['description'] == "Wrong project"
+
+
+async def test_reversal_of_a_reversal_is_not_found(db):
+    await add_project(db)
+    created = await server.create_expense({"project_id": "p1", "category": "food", "amount": 40, "description": "Tea"}, ADMIN)
+    reversed_ = await server.reverse_expense(created['id'], None, ADMIN)
+
+    with pytest.raises(HTTPException) as error:
+        await server.reverse_expense(reversed_['id'], None, ADMIN)
+    assert error.value.status_code == 404
+
+
+async def test_legacy_project_gets_remaining_before_first_rollup(db):
+    await add_project(db, spent=200.0)
+    await db.projects.update_one({"id": "p1"}, {"$unset": {"remaining": ""}})
+    await server.create_expense({"project_id": "p1", "category": "food", "amount": 50, "description": "Snacks"}, ADMIN)
+
+    project = await get_project(db)
+    assert project['remaining'] == pytest.approx(750)
+    assert project['spent'] == pytest.approx(250)
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(server, "MIGRATION_BATCH_SIZE", 2)
+    monkeypatch.setattr(server, "MIGRATION_PAUSE_SECONDS", 0)
+
+
+async def add_legacy_news(db, count):
+    await db.news.insert_many([
+        {"id": f"n{i}", "title": f"News {i}", "created_at": f"2024-01-{i + 1:02d}T10:00:00+00:00"}
+        for i in range(count)
+    ])
+
+
+async def test_migration_converts_dates(db):
+    await add_legacy_news(db, 3)
+    assert await server.run_migration(1) is True
+
+    async for doc in db.news.find():
+        assert isinstance(doc['created_at'], datetime)
+    record = await db.schema_migrations.find_one({"version": 1})
+    assert record['status'] == "completed"
+    assert record['progress']['news']['modified'] == 3
+    # A completed migration is not claimed again
+    assert await server.run_migration(1) is False
+
+
+async def test_migration_resumes_after_partial_run(db, monkeypatch):
+    await add_legacy_news(db, 5)
+    storage_changes = server.storage_changes
+    seen = []
+
+    def fail_in_second_batch(collection, doc, **options):
+        seen.append(doc['_id'])
+        if len(seen) == 3:
+            raise RuntimeError("connection reset")
+        return storage_changes(collection, doc, **options)
+
+    monkeypatch.setattr(server, "storage_changes", fail_in_second_batch)
+    with pytest.raises(RuntimeError):
+        await server.run_migration(1)
+
+    record = await db.schema_migrations.find_one({"version": 1})
+    assert record['status'] == "failed"
+    assert record['lease_until'] is None
+    assert record['progress']['news']['scanned'] == 2
+    assert await db.news.count_documents({"created_at": {"$type": "string"}}) == 3
+
+    monkeypatch.setattr(server, "storage_changes", storage_changes)
+    assert await server.run_migration(1) is True
+
+    record = await db.schema_migrations.find_one({"version": 1})
+    assert record['status'] == "completed"
+    # The first batch was recorded, so the rerun starts after it
+    assert record['progress']['news']['scanned'] == 5
+    assert record['progress']['news']['modified'] == 5
+    async for doc in db.news.find():
+        assert isinstance(doc['created_at'], datetime)
+
+
+async def test_running_migration_is_not_claimed_twice(db):
+    assert await server.claim_migration(1, "worker-a") is True
+    assert await server.claim_migration(1, "worker-b") is False